@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+'''
+DEFINICIONES
+Shunk module Schunk_definiciones.py
+Autor: Ramon
+Fecha Inicio: Octubre 18 2026
+Propósito: Definición única de las tablas clean (columnas a leer, mapas de renombre y limpieza)
+           que comparten Schunk_clean.py y Schunk_pipeline.py
+Dependencias: CLIENTES, PROVEEDORES, IVA ACREDITABLE, IVA TRASLADADO
+Fecha de modificación: (Razón y fecha)
+'''
+#____________________________________________
+#librerias python
+import pandas as pd
+#____________________________________________
+#librerias RPG
+from utils.df_utils import normalizar_llave
+from utils.df_utils import normalizar_nulos
+#____________________________________________
+
+COMPANIA = "SCHUNK" #Partición de compañía en clean
+
+#______________________________________________
+#COLUMNAS A LEER (solo estas se leen del parquet)
+clientes_proveedores_list = [
+                "Description Offsetting Item",
+                 "Assignment",
+                 "Document Number",
+                 "Document Type",
+                 "Tax Code",
+                 "Withholding Tax Amt",
+                 "Clearing Document",
+                 "Text"]
+
+cobrado_acreditable_list = [
+                    "Debit/Credit Ind.",
+                    "Offsetting Acct Type",
+                    "Document Number",
+                    "Document Type",
+                    "Assignment",
+                    "Description Offsetting Item",
+                    "Document Date",
+                    "Amount in Local Currency",
+                    "Amount in Doc. Curr.",
+                    "Document Currency",
+                    "Eff. Exchange Rate"]
+
+bancos_list = [
+            "Account",
+            "Document Number",
+            "Document Date",
+            "Amount in Doc. Curr."]
+
+cfdi_list = [
+        "UUID",
+        "Serie",
+        "Folio"]
+
+#______________________________________________
+#MAPAS DE RENOMBRE
+proveedores_rename = {
+                "Description Offsetting Item": "Nombre Proveedor",
+                 "Assignment": "Folio Interno",
+                 "Document Number":"Merge_Key",
+                 "Document Type":"Tipo Documento Aux",
+                 "Tax Code":"filtro1",
+                 "Withholding Tax Amt":"filtro2",
+                 "Clearing Document" : "Merge_Key_Bank",
+                 "Text": "Observaciones"}
+
+clientes_rename = {
+                **proveedores_rename,
+                "Description Offsetting Item": "Nombre Cliente"}
+
+cobrado_acreditable_rename = {
+                    "Debit/Credit Ind.": "Filtro1",
+                    "Offsetting Acct Type": "Filtro2",
+                    "Document Number":"Poliza / No documento/ Compensacion/ Referencia",
+                    "Document Type":"Tipo Documento",
+                    "Assignment":"Merge_Key_Aux",
+                    "Document Date":"Fecha de emisión",
+                    "Amount in Local Currency":"Importe MXN",
+                    "Amount in Doc. Curr.":"Importe",
+                    "Document Currency" :"Moneda",
+                    "Eff. Exchange Rate" :"TC Reporte"}
+
+bancos_rename = {
+            "Account":"Banco",
+            "Document Number":"Merge_Key",
+            "Document Date":"Fecha Banco",
+            "Amount in Doc. Curr.":"Importe Banco"}
+
+#______________________________________________
+#LIMPIEZA
+
+def limpiar_maestro(df):
+    #proveedores / clientes
+    #Los parquets raw ya vienen normalizados; se repite por si vienen de una conversión sin tipado
+    df = normalizar_nulos(df)
+    df["Merge_Key"], _ = normalizar_llave(df["Merge_Key"])
+    return df
+
+
+def limpiar_movimientos(df):
+    #cobranza / acreditable
+    df = normalizar_nulos(df)
+    df["TC Reporte"] = df["TC Reporte"].fillna(0)
+    df["Merge_Key_Aux"], _ = normalizar_llave(df["Merge_Key_Aux"])
+    df["Merge_Key_Aux"] = df["Merge_Key_Aux"].astype("string").str[:-7]
+    df["TC Reporte"] = df["TC Reporte"].astype(float).map(lambda x: f"{x:.4f}")
+    return df
+
+
+def limpiar_bancos(df):
+    df = normalizar_nulos(df)
+    df["Fecha Banco"] = pd.to_datetime(df["Fecha Banco"]).dt.strftime("%d/%m/%Y")
+    return df
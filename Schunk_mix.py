@@ -12,15 +12,19 @@ Fecha de modificación: (Razón y fecha)
 #____________________________________________#____________________________________________
 #librerias python
 import os 
+import tempfile
 import pandas as pd
 import numpy as np
 from pathlib import Path
 #____________________________________________
 #librerias RPG
 from utils.df_utils import leer_parquet
-from utils.df_utils import guardar_dataframe
-from utils.df_utils import Guardar_Formato
+from utils.df_utils import exportar_destinos
+from utils.source_utils import reportar_resultados
 from utils.df_utils import unir_dataframes
+from utils.df_utils import construir_indice
+from utils.catalogo import obtener_catalogo
+from utils.union_disco import unir_en_disco
 #____________________________________________ 
 #INGESTA DE ARCHIVOS
 
@@ -28,20 +32,57 @@ if __name__ == "__main__":
     path = Path(os.environ["USERPROFILE"]) / r"OneDrive - CONSULTORIA GLOBAL RPG S.C\Desktop\RPG\SCHUNK\parquets" #Ruta para guardar archivos limpios
     folder = Path(os.environ["USERPROFILE"]) / r"OneDrive - CONSULTORIA GLOBAL RPG S.C\Desktop\RPG\SCHUNK\parquets\clean" #Ruta de archivos crudos
 
-proveedores = leer_parquet(folder, "PROVEEDORES", exact_match=False)
-clientes = leer_parquet(folder, "CLIENTES", exact_match=False)
-acreditable = leer_parquet(folder, "ACREDITABLE", exact_match=False)
-cobrado = leer_parquet(folder, "COBRANZA", exact_match=False)
-bancos = leer_parquet(folder, "BANCOS", exact_match=False)
-cfdi_emitidos = leer_parquet(folder, "EMITIDOS", exact_match=False)
-cfdi_recibidos = leer_parquet(folder, "RECIBIDOS", exact_match=False)
+#True para clientes cuyas tablas no caben en memoria: las uniones se hacen por particiones en disco
+FUERA_DE_MEMORIA = False
 
-layout_depos = unir_dataframes(cobrado, clientes, "Merge_Key_Aux", "Merge_Key", tipo_union="left")
-layout_depos = unir_dataframes(layout_depos, bancos, "Merge_Key_Bank", "Merge_Key", tipo_union="left")
+if FUERA_DE_MEMORIA:
+    catalogo = obtener_catalogo(folder)
 
-layout_retiros = unir_dataframes(acreditable, proveedores, "Merge_Key_Aux", "Merge_Key", tipo_union="left")
-layout_retiros = unir_dataframes(layout_retiros, bancos, "Merge_Key_Bank", "Merge_Key", tipo_union="left")
+    def ruta(nombre):
+        entrada = catalogo.resolver(nombre, exact_match=False)
+        if entrada is None:
+            raise SystemExit(f"  [ERROR] No se encontró {nombre} en {folder}")
+        return entrada["ruta"]
 
-guardar_dataframe(layout_depos, path, "mix", "Layout_Depósitos", formato='csv')
-guardar_dataframe(layout_retiros, path, "mix", "Layout_Retiros", formato='csv')
-Guardar_Formato(layout_depos, path, "mix", "Layout_Depósitos")
\ No newline at end of file
+    #Se resuelven todas antes de unir para no dejar layouts a medias si falta un reporte
+    for nombre in ("COBRANZA", "CLIENTES", "ACREDITABLE", "PROVEEDORES", "BANCOS"):
+        ruta(nombre)
+    mix = os.path.join(path, "mix")
+    os.makedirs(mix, exist_ok=True)
+
+    with tempfile.TemporaryDirectory(dir=mix) as temporal:
+        depos_clientes = os.path.join(temporal, "depos_clientes.parquet")
+        unir_en_disco(ruta("COBRANZA"), ruta("CLIENTES"), "Merge_Key_Aux", "Merge_Key", depos_clientes)
+        unir_en_disco(depos_clientes, ruta("BANCOS"), "Merge_Key_Bank", "Merge_Key", os.path.join(mix, "Layout_Depósitos.csv"))
+
+        retiros_proveedores = os.path.join(temporal, "retiros_proveedores.parquet")
+        unir_en_disco(ruta("ACREDITABLE"), ruta("PROVEEDORES"), "Merge_Key_Aux", "Merge_Key", retiros_proveedores)
+        unir_en_disco(retiros_proveedores, ruta("BANCOS"), "Merge_Key_Bank", "Merge_Key", os.path.join(mix, "Layout_Retiros.csv"))
+    #El layout en Excel se omite en este modo: Guardar_Formato recibe el DataFrame completo
+
+else:
+    proveedores = leer_parquet(folder, "PROVEEDORES", exact_match=False)
+    clientes = leer_parquet(folder, "CLIENTES", exact_match=False)
+    acreditable = leer_parquet(folder, "ACREDITABLE", exact_match=False)
+    cobrado = leer_parquet(folder, "COBRANZA", exact_match=False)
+    bancos = leer_parquet(folder, "BANCOS", exact_match=False)
+    cfdi_emitidos = leer_parquet(folder, "EMITIDOS", exact_match=False)
+    cfdi_recibidos = leer_parquet(folder, "RECIBIDOS", exact_match=False)
+
+    #bancos se une dos veces por Merge_Key: el índice se construye una sola vez
+    indice_bancos = construir_indice(bancos, "Merge_Key")
+
+    layout_depos = unir_dataframes(cobrado, clientes, "Merge_Key_Aux", "Merge_Key", tipo_union="left", rapido=True)
+    layout_depos = unir_dataframes(layout_depos, bancos, "Merge_Key_Bank", "Merge_Key", tipo_union="left", indice=indice_bancos)
+
+    layout_retiros = unir_dataframes(acreditable, proveedores, "Merge_Key_Aux", "Merge_Key", tipo_union="left", rapido=True)
+    layout_retiros = unir_dataframes(layout_retiros, bancos, "Merge_Key_Bank", "Merge_Key", tipo_union="left", indice=indice_bancos)
+
+    #Los tres archivos se escriben al mismo tiempo
+    mix = os.path.join(path, "mix")
+    resultados = exportar_destinos([
+        (layout_depos, "csv", os.path.join(mix, "Layout_Depósitos.csv")),
+        (layout_retiros, "csv", os.path.join(mix, "Layout_Retiros.csv")),
+        (layout_depos, "xlsx", os.path.join(mix, "Layout_Depósitos.xlsx")),
+    ])
+    reportar_resultados(resultados, "Exportación completada.")
\ No newline at end of file
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+'''
+PIPELINE
+Shunk module Schunk_pipeline.py
+Autor: Ramon
+Fecha Inicio: Octubre 18 2026
+Propósito: Declarar raw -> clean -> mix como un solo DAG con pasos en cache, para que un cambio
+           (p.ej. un mapa de renombre) solo vuelva a ejecutar las tablas y layouts afectados
+Dependencias: CLIENTES, PROVEEDORES, IVA ACREDITABLE, IVA TRASLADADO
+Fecha de modificación: (Razón y fecha)
+'''
+#____________________________________________
+#librerias python
+import os
+from pathlib import Path
+#____________________________________________
+#librerias RPG
+from utils.pipeline import Pipeline, huella_parquet
+from utils.source_utils import convert_to_parquet
+from utils.df_utils import leer_parquet
+from utils.df_utils import guardar_dataframe
+from utils.df_utils import Guardar_Formato
+from utils.df_utils import renombrar_columnas
+from utils.df_utils import unir_dataframes
+from Schunk_definiciones import COMPANIA
+from Schunk_definiciones import clientes_proveedores_list, cobrado_acreditable_list, bancos_list, cfdi_list
+from Schunk_definiciones import proveedores_rename, clientes_rename, cobrado_acreditable_rename, bancos_rename
+from Schunk_definiciones import limpiar_maestro, limpiar_movimientos, limpiar_bancos
+#____________________________________________
+#PASOS
+
+def ingesta_raw(ruta_origen, ruta_destino):
+    #convert_to_parquet ya omite las fuentes sin cambios con su manifest
+    convert_to_parquet(ruta_origen, ruta_destino, workers=-1)
+
+
+def leer(_raw, folder, reporte, columns):
+    return leer_parquet(folder, reporte, exact_match=False, columns=columns)
+
+
+def renombrar(df, mapa):
+    return renombrar_columnas(df, mapa)
+
+
+def unir(df_1, df_2, col1, col2):
+    return unir_dataframes(df_1, df_2, col1, col2, tipo_union="left", rapido=True)
+
+
+def exportar(df, carpeta_base, subcarpeta, nombre_archivo, formato, **opciones):
+    guardar_dataframe(df, carpeta_base, subcarpeta, nombre_archivo, formato=formato, **opciones)
+    if opciones.get("particionado"):
+        return os.path.join(carpeta_base, subcarpeta, nombre_archivo)
+    return os.path.join(carpeta_base, subcarpeta, f"{nombre_archivo}.{formato}")
+
+
+def exportar_excel(df, carpeta_base, subcarpeta, nombre_archivo):
+    Guardar_Formato(df, carpeta_base, subcarpeta, nombre_archivo)
+    return os.path.join(carpeta_base, subcarpeta, f"{nombre_archivo}.xlsx")
+
+
+#tablas de clean que se guardan por compañía/año/mes
+particionadas = {"cobranza", "acreditable"}
+
+
+def construir_pipeline(inputs, parquets):
+    raw = os.path.join(parquets, "raw")
+    p = Pipeline(os.path.join(parquets, "cache"))
+
+    p.paso("raw", ingesta_raw, cache=False, ruta_origen=str(inputs), ruta_destino=raw)
+
+    #tablas clean: leer -> renombrar -> normalizar -> exportar
+    tablas = {
+        "proveedores": ("PROVEEDORES", clientes_proveedores_list, proveedores_rename, limpiar_maestro),
+        "clientes": ("CLIENTES", clientes_proveedores_list, clientes_rename, limpiar_maestro),
+        "cobranza": ("COBRADO", cobrado_acreditable_list, cobrado_acreditable_rename, limpiar_movimientos),
+        "acreditable": ("ACREDITABLE", cobrado_acreditable_list, cobrado_acreditable_rename, limpiar_movimientos),
+        "bancos": ("BANCOS", bancos_list, bancos_rename, limpiar_bancos),
+        "emitidos": ("EMITIDOS", cfdi_list, None, None),
+        "recibidos": ("RECIBIDOS", cfdi_list, None, None),
+    }
+    t = {}
+    for tabla, (nombre, columnas, mapa, limpieza) in tablas.items():
+        ultimo = p.paso(f"{tabla}.leer", leer, ["raw"], huella=huella_parquet(raw, nombre),
+                        folder=raw, reporte=nombre, columns=columnas)
+        if mapa:
+            ultimo = p.paso(f"{tabla}.renombrar", renombrar, [ultimo], mapa=mapa)
+        if limpieza:
+            ultimo = p.paso(f"{tabla}.normalizar", limpieza, [ultimo])
+        t[tabla] = ultimo
+        particion = dict(particionado=True, compania=COMPANIA) if tabla in particionadas else {}
+        p.paso(f"{tabla}.exportar", exportar, [ultimo],
+               carpeta_base=str(parquets), subcarpeta="clean", nombre_archivo=tabla, formato="parquet", **particion)
+
+    #layouts mix
+    p.paso("depos.clientes", unir, [t["cobranza"], t["clientes"]], col1="Merge_Key_Aux", col2="Merge_Key")
+    p.paso("depos", unir, ["depos.clientes", t["bancos"]], col1="Merge_Key_Bank", col2="Merge_Key")
+    p.paso("retiros.proveedores", unir, [t["acreditable"], t["proveedores"]], col1="Merge_Key_Aux", col2="Merge_Key")
+    p.paso("retiros", unir, ["retiros.proveedores", t["bancos"]], col1="Merge_Key_Bank", col2="Merge_Key")
+
+    p.paso("depos.csv", exportar, ["depos"],
+           carpeta_base=str(parquets), subcarpeta="mix", nombre_archivo="Layout_Depósitos", formato="csv")
+    p.paso("retiros.csv", exportar, ["retiros"],
+           carpeta_base=str(parquets), subcarpeta="mix", nombre_archivo="Layout_Retiros", formato="csv")
+    p.paso("depos.xlsx", exportar_excel, ["depos"],
+           carpeta_base=str(parquets), subcarpeta="mix", nombre_archivo="Layout_Depósitos")
+    return p
+
+#____________________________________________
+#EJECUCIÓN
+
+if __name__ == "__main__":
+    inputs = Path(os.environ["USERPROFILE"]) / r"OneDrive - CONSULTORIA GLOBAL RPG S.C\Desktop\RPG\SCHUNK\inputs" #Ruta de archivos a convertir
+    parquets = Path(os.environ["USERPROFILE"]) / r"OneDrive - CONSULTORIA GLOBAL RPG S.C\Desktop\RPG\SCHUNK\parquets" #Ruta de parquets (raw, clean, mix y cache)
+
+    construir_pipeline(inputs, parquets).ejecutar()
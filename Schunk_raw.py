@@ -17,9 +17,7 @@ import numpy as np
 from pathlib import Path
 #____________________________________________
 #librerias RPG
-from utils.excel_to_csv import xlsb_convert_to_csv
 from utils.source_utils import convert_to_parquet
-from utils.source_utils import bulk_csv_to_utf8
 #____________________________________________ 
 #INGESTA DE ARCHIVOS
 
@@ -28,6 +26,5 @@ if __name__ == "__main__":
     path = Path(os.environ["USERPROFILE"]) / r"OneDrive - CONSULTORIA GLOBAL RPG S.C\Desktop\RPG\SCHUNK\inputs" #Ruta de archivos a convertir
     folder = Path(os.environ["USERPROFILE"]) / r"OneDrive - CONSULTORIA GLOBAL RPG S.C\Desktop\RPG\SCHUNK\parquets\raw" #Ruta de archivos convertid os
     print(path)
-    xlsb_convert_to_csv(path)
-    bulk_csv_to_utf8(path)
-    convert_to_parquet(path, folder)
\ No newline at end of file
+    #Lectura directa de excel/xlsb a parquet, csv_debug=True deja copia csv en parquets\raw\csv_debug
+    convert_to_parquet(path, folder, csv_debug=False, workers=-1) #workers=-1 usa todos los núcleos
\ No newline at end of file
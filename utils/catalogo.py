@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+import os
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+def _base(nombre):
+    # Nombre lógico: sin .parquet para archivos; los datasets particionados son carpetas sin extensión
+    return nombre[:-len(".parquet")] if nombre.endswith(".parquet") else nombre
+
+
+def es_dataset(ruta):
+    # """
+    # True si la carpeta es un dataset particionado estilo Hive (subcarpetas columna=valor).
+    # """
+    with os.scandir(ruta) as entradas:
+        return any(e.is_dir() and "=" in e.name for e in entradas)
+
+
+def esquema_dataset(ruta):
+    # """
+    # Esquema de un dataset particionado unificando el de todos sus archivos más las columnas de
+    # partición. Cada mes se escribe por separado y una columna toda nula en un mes queda con tipo
+    # null; ds.dataset solo toma el esquema del primer archivo.
+    # """
+    dataset = ds.dataset(ruta, format="parquet", partitioning="hive")
+    esquemas = [fragmento.physical_schema for fragmento in dataset.get_fragments()]
+    return pa.unify_schemas(esquemas + [dataset.partitioning.schema], promote_options="permissive")
+
+
+class CatalogoParquet:
+    # """
+    # Índice en memoria de los parquets de una carpeta: nombre, ruta, tamaño, filas y esquema
+    # (leídos del footer, sin cargar datos). Se arma con un solo listado de la carpeta y
+    # las búsquedas posteriores se resuelven en memoria. Los datasets particionados
+    # (carpeta/compania=.../anio=.../mes=...) aparecen como una sola entrada con "dataset": True.
+
+    # Args:
+    #     folder (str): Ruta de la carpeta con los archivos .parquet.
+    # """
+
+    def __init__(self, folder):
+        self.folder = os.path.abspath(folder)
+        self.archivos = {}
+        self.refrescar()
+
+    def refrescar(self):
+        # """
+        # Vuelve a listar la carpeta. Solo relee el footer de los archivos nuevos o modificados.
+        # """
+        archivos = {}
+        with os.scandir(self.folder) as entradas:
+            for entrada in entradas:
+                if entrada.is_dir() and es_dataset(entrada.path):
+                    archivos[entrada.name] = self._entrada_dataset(entrada)
+                    continue
+                if not (entrada.is_file() and entrada.name.endswith(".parquet")):
+                    continue
+
+                stat = entrada.stat()
+                previo = self.archivos.get(entrada.name)
+                if previo and previo["bytes"] == stat.st_size and previo["mtime"] == stat.st_mtime:
+                    archivos[entrada.name] = previo
+                    continue
+
+                metadata = pq.read_metadata(entrada.path)
+                archivos[entrada.name] = {
+                    "nombre": entrada.name,
+                    "ruta": entrada.path,
+                    "bytes": stat.st_size,
+                    "mtime": stat.st_mtime,
+                    "filas": metadata.num_rows,
+                    "esquema": metadata.schema.to_arrow_schema(),
+                    "dataset": False,
+                }
+
+        self.archivos = dict(sorted(archivos.items()))
+        return self
+
+    def _entrada_dataset(self, entrada):
+        # Tamaño y mtime del dataset = suma y máximo de sus archivos; los footers solo se releen si cambió
+        stats = [os.stat(os.path.join(raiz, nombre))
+                 for raiz, _, nombres in os.walk(entrada.path) for nombre in nombres if nombre.endswith(".parquet")]
+        tamano = sum(st.st_size for st in stats)
+        mtime = max((st.st_mtime for st in stats), default=0.0)
+
+        previo = self.archivos.get(entrada.name)
+        if previo and previo["bytes"] == tamano and previo["mtime"] == mtime and previo.get("partes") == len(stats):
+            return previo
+
+        dataset = ds.dataset(entrada.path, format="parquet", partitioning="hive")
+        return {
+            "nombre": entrada.name,
+            "ruta": entrada.path,
+            "bytes": tamano,
+            "mtime": mtime,
+            "filas": dataset.count_rows(),
+            "esquema": esquema_dataset(entrada.path),
+            "dataset": True,
+            "partes": len(stats),
+            "particiones": dataset.partitioning.schema.names,
+        }
+
+    def buscar(self, nombre_archivo, exact_match=True, prefijo=False):
+        # """
+        # Devuelve las entradas que coinciden con el nombre, ordenadas por nombre de archivo.
+
+        # Args:
+        #     nombre_archivo (str): Nombre (con o sin .parquet) o parte del nombre.
+        #     exact_match (bool): Si True, el nombre debe coincidir completo.
+        #     prefijo (bool): Si True (y exact_match False), el nombre debe empezar con nombre_archivo.
+
+        # Returns:
+        #     list: Entradas del catálogo.
+        # """
+        buscado = str(nombre_archivo)
+        if buscado.lower().endswith(".parquet"):
+            buscado = buscado[:-len(".parquet")]
+
+        coincidencias = []
+        for nombre, entrada in self.archivos.items():
+            base = _base(nombre)
+            if exact_match:
+                ok = base == buscado
+            elif prefijo:
+                ok = base.upper().startswith(buscado.upper())
+            else:
+                ok = buscado.upper() in base.upper()
+            if ok:
+                coincidencias.append(entrada)
+        return coincidencias
+
+    def resolver(self, nombre_archivo, exact_match=True):
+        # """
+        # Resuelve un nombre lógico ("COBRANZA", "PROVEEDORES") a un solo archivo de forma determinista:
+        # primero el que se llama exactamente así (sin distinguir mayúsculas); si hay varios parciales,
+        # el modificado más recientemente y, a igual fecha, el primero por nombre. Avisa si hubo ambigüedad.
+
+        # Returns:
+        #     dict: Entrada del catálogo o None si no hay coincidencias.
+        # """
+        candidatos = self.buscar(nombre_archivo, exact_match=exact_match)
+        if not candidatos:
+            return None
+        if len(candidatos) == 1:
+            return candidatos[0]
+
+        buscado = str(nombre_archivo).upper()
+        exactos = [c for c in candidatos if _base(c["nombre"]).upper() == buscado]
+        if len(exactos) == 1:
+            return exactos[0]
+
+        elegido = sorted(candidatos, key=lambda c: (-c["mtime"], c["nombre"]))[0]
+        print(f"  [WARN] '{nombre_archivo}' coincide con {[c['nombre'] for c in candidatos]}; se usa {elegido['nombre']} (más reciente).")
+        return elegido
+
+
+_CATALOGOS = {}
+
+
+def obtener_catalogo(folder, refrescar=False):
+    # """
+    # Devuelve el catálogo de la carpeta, armándolo la primera vez y reutilizándolo después.
+
+    # Args:
+    #     folder (str): Ruta de la carpeta.
+    #     refrescar (bool): Si True, vuelve a listar la carpeta.
+
+    # Returns:
+    #     CatalogoParquet
+    # """
+    clave = os.path.abspath(folder)
+    catalogo = _CATALOGOS.get(clave)
+    if catalogo is None:
+        catalogo = _CATALOGOS[clave] = CatalogoParquet(clave)
+    elif refrescar:
+        catalogo.refrescar()
+    return catalogo
+
+
+def invalidar_catalogo(folder):
+    # """
+    # Descarta el catálogo en memoria de una carpeta (p.ej. después de escribir en ella).
+    # """
+    _CATALOGOS.pop(os.path.abspath(folder), None)
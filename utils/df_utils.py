@@ -1,94 +1,159 @@
 ﻿# -*- coding: utf-8 -*-
 import os
 import re 
+import json
+import pickle
+import hashlib
 import glob
+import time
 import logging
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 from pathlib import Path
-from decimal import Decimal
-#from rapidfuzz import process, fuzz
-
-
-def leer_parquet(folder, nombre_archivo, exact_match=True):
+from decimal import Decimal, InvalidOperation
+from pandas.tseries.api import guess_datetime_format
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from utils.catalogo import obtener_catalogo, invalidar_catalogo, esquema_dataset
+from utils.esquemas import detectar_encabezado
+
+
+COLUMNAS_PARTICION = ("compania", "anio", "mes")
+
+
+def _leer_archivo_parquet(ruta_completa, columns=None, filters=None, esquema=None):
+    # Lee solo las columnas pedidas que existan en el archivo y aplica los filtros en el lector,
+    # así las columnas y row groups descartados no se leen de disco
+    dataset = os.path.isdir(ruta_completa)
+    if dataset:
+        # Particiones Hive: los filtros sobre compania/anio/mes descartan carpetas completas. El
+        # esquema unificado de todos los meses evita que uno con una columna toda nula rompa la lectura
+        esquema = esquema_dataset(ruta_completa)
+        dataset = ds.dataset(ruta_completa, format="parquet", partitioning="hive", schema=esquema)
+
+    if columns is not None:
+        disponibles = (esquema or pq.read_schema(ruta_completa)).names
+        faltantes = [col for col in columns if col not in disponibles]
+        if faltantes:
+            print(f"  [WARN] Columnas no encontradas y no se incluiran: {faltantes}")
+        columns = [col for col in columns if col in disponibles]
+
+    if not dataset:
+        return pd.read_parquet(ruta_completa, engine="pyarrow", columns=columns, filters=filters)
+
+    if columns is None:
+        # Las columnas de partición solo se devuelven si se piden; así el DataFrame queda igual
+        # que el que se guardó
+        columns = [col for col in dataset.schema.names if col not in COLUMNAS_PARTICION]
+    filtro = pq.filters_to_expression(filters) if filters else None
+    return dataset.to_table(columns=columns, filter=filtro).to_pandas()
+
+
+def _periodo(periodo):
+    # "2026-01", (2026, 1) o 2026 / "2026" (todo el año) -> filtros de anio/mes
+    if isinstance(periodo, (tuple, list)):
+        anio, mes = periodo
+    else:
+        partes = str(periodo).replace("/", "-").split("-")
+        anio, mes = partes[0], (partes[1] if len(partes) > 1 else None)
+    filtros = [("anio", "=", int(anio))]
+    if mes is not None:
+        filtros.append(("mes", "=", int(mes)))
+    return filtros
+
+
+def _filtros_periodo(filters=None, periodos=None, compania=None):
+    # Combina los filtros del usuario con compañía y periodos (forma normal disyuntiva de pyarrow:
+    # lista de listas = OR de ANDs). Si el usuario ya pasó una DNF, compañía y periodos se agregan
+    # a cada una de sus ramas
+    filters = list(filters or [])
+    if filters and not isinstance(filters[0][0], str):
+        ramas = [list(rama) for rama in filters]
+    else:
+        ramas = [filters]
+    if compania is not None:
+        ramas = [rama + [("compania", "=", str(compania))] for rama in ramas]
+    if periodos is None:
+        if len(ramas) == 1:
+            return ramas[0] or None
+        return ramas
+    if isinstance(periodos, (str, int)) or (isinstance(periodos, tuple) and len(periodos) == 2
+                                             and all(isinstance(x, int) for x in periodos)):
+        periodos = [periodos]
+    return [rama + _periodo(periodo) for rama in ramas for periodo in periodos]
+
+
+def leer_parquet(folder, nombre_archivo, exact_match=True, columns=None, filters=None,
+                 periodos=None, compania=None):
     # """
-    # Lee un archivo parquet desde una carpeta específica.
+    # Lee un archivo parquet desde una carpeta específica. La carpeta se indexa una sola vez
+    # (utils.catalogo) y las búsquedas siguientes se resuelven en memoria.
 
     # Args:
-    #     folder (str): Subcarpeta ("raw", "clean", "mix", etc.).
+    #     folder (str): Ruta de la carpeta (...\parquets\raw, ...\parquets\clean, etc.).
     #     nombre_archivo (str): Nombre del archivo (con o sin extensión .parquet).
-    #     exact_match (bool): Indica si la búsqueda del archivo debe ser exacta.
+    #     exact_match (bool): Indica si la búsqueda del archivo debe ser exacta. Si es parcial y hay
+    #         varias coincidencias se elige de forma determinista (ver CatalogoParquet.resolver).
+    #     columns (list, optional): Columnas a leer; las que no existan se avisan y se ignoran.
+    #     filters (list, optional): Filtros de pyarrow que se evalúan al leer, p.ej.
+    #         [("Document Date", ">=", pd.Timestamp("2026-01-01")), ("Document Type", "in", ["DZ", "KZ"])]
+    #     periodos (list, optional): Solo para datasets particionados (guardar_dataframe(particionado=True)):
+    #         periodos a leer como "2026-01", (2026, 1) o 2026 (año completo). Solo se abren esas carpetas.
+    #     compania (str, optional): Solo para datasets particionados: compañía a leer.
 
     # Returns:
     #     pd.DataFrame: DataFrame leído del archivo parquet.
     # """
-    base_path =  r"C:\Macros_C\Bitron ex\parquets"
-    # base_path = r"C:\Users\<SIGNUM>\Downloads\ATT_COP\parquet"
+    try:
+        filters = _filtros_periodo(filters, periodos, compania)
+        catalogo = obtener_catalogo(folder)
+        entrada = catalogo.resolver(nombre_archivo, exact_match=exact_match)
 
-    # Obtener la ruta completa del directorio
-    folder_path = os.path.join(base_path, folder)
+        # El archivo pudo cambiar desde que se armó el catálogo
+        if entrada is None or not os.path.exists(entrada["ruta"]):
+            entrada = catalogo.refrescar().resolver(nombre_archivo, exact_match=exact_match)
 
-    try:
-        # Iterar sobre archivos en la carpeta especificada
-        for filename in os.listdir(folder_path):
-            # Verificar si el archivo es un parquet
-            if filename.endswith('.parquet'):
-                if exact_match:
-                    if filename == nombre_archivo or filename == nombre_archivo + ".parquet":
-                        # Ruta completa del archivo
-                        ruta_completa = os.path.join(folder_path, filename)
-                        df = pd.read_parquet(ruta_completa)
-                        print(f"Cargado: {ruta_completa}")
-                        return df
-                else:
-                    # Si no es una coincidencia exacta, buscar archivos que contengan el nombre
-                    if nombre_archivo in filename.rsplit('.', 1)[0].upper():
-                        # Ruta completa del archivo
-                        ruta_completa = os.path.join(folder_path, filename)
-                        df = pd.read_parquet(ruta_completa)
-                        print(f"Cargado: {ruta_completa}")
-                        return df
-        print(f"  [WARN] No se encontró el archivo: {nombre_archivo}")
-        return None
+        if entrada is None:
+            print(f"  [WARN] No se encontró el archivo: {nombre_archivo}")
+            return None
+
+        df = _leer_archivo_parquet(entrada["ruta"], columns, filters, esquema=entrada["esquema"])
+        print(f"Cargado: {entrada['ruta']}")
+        return df
 
     except Exception as e:
-        print(f"  [ERROR] al leer archivos en {folder_path}: {e}")
+        print(f"  [ERROR] al leer archivos en {folder}: {e}")
         return None
     
 
-def varios_parquets(folder, nombre_archivo, exact_match=False):
+def varios_parquets(folder, nombre_archivo, exact_match=False, columns=None, filters=None):
     # """
     # Lee y combina múltiples archivos Parquet en un directorio que coincidan con un nombre dado.
 
     # Args:
-    # - base_path (str): Ruta base del directorio.
-    # - folder (str): Subcarpeta dentro de la ruta base donde buscar los archivos.
+    # - folder (str): Ruta de la carpeta donde buscar los archivos.
     # - nombre_archivo (str): Nombre de archivo o prefijo para buscar.
     # - exact_match (bool): Si True, busca coincidencias <SIGNUM>; si False, busca coincidencias parciales.
+    # - columns (list, optional): Columnas a leer de cada archivo.
+    # - filters (list, optional): Filtros de pyarrow que se evalúan al leer (ver leer_parquet).
 
     # Returns:
     # - pd.DataFrame: DataFrame combinado de todos los archivos que coinciden con los criterios.
     # """
-    # Obtener la ruta completa del directorio
-    base_path = r"C:\Users\guil\Desktop\NCO\ATT_NCO\parquet"
-    folder_path = os.path.join(base_path, folder)
-
     try:
         # Lista para almacenar DataFrames
         dataframes = []
 
-        # Crear el patrón de búsqueda para los archivos
-        if exact_match:
-            file_pattern = os.path.join(folder_path, f'{nombre_archivo}.parquet')
-        else:
-            file_pattern = os.path.join(folder_path, f'{nombre_archivo}*.parquet')
-
-        # Buscar todos los archivos Parquet que siguen el patrón
-        parquet_files = glob.glob(file_pattern)
+        # Archivos que coinciden, en orden de nombre
+        entradas = obtener_catalogo(folder, refrescar=True).buscar(nombre_archivo, exact_match=exact_match, prefijo=True)
 
         # Leer y combinar los DataFrames
-        for ruta_completa in parquet_files:
-            df = pd.read_parquet(ruta_completa)
-            print(f"Cargado: {ruta_completa}")
+        for entrada in entradas:
+            df = _leer_archivo_parquet(entrada["ruta"], columns, filters, esquema=entrada["esquema"])
+            print(f"Cargado: {entrada['ruta']}")
             dataframes.append(df)
 
         if dataframes:
@@ -100,7 +165,7 @@ def varios_parquets(folder, nombre_archivo, exact_match=False):
             return None
 
     except Exception as e:
-        print(f"  [ERROR] al leer archivos en {folder_path}: {e}")
+        print(f"  [ERROR] al leer archivos en {folder}: {e}")
         return None
 
 
@@ -142,7 +207,244 @@ def reordenar_columnas(df, nuevo_orden):
 
 
 
-def unir_dataframes(df_1, df_2, col1, col2, tipo_union="left"):
+def _claves_arrow(serie):
+    # Columna clave como arreglo de Arrow; los nulos (None, NaN, pd.NA) quedan como null
+    if isinstance(serie, (pa.Array, pa.ChunkedArray)):
+        arreglo = serie
+    else:
+        arreglo = pa.array(serie, from_pandas=True)
+    if isinstance(arreglo, pa.ChunkedArray):
+        arreglo = arreglo.combine_chunks()
+    if pa.types.is_string(arreglo.type):
+        arreglo = arreglo.cast(pa.large_string())
+    return arreglo
+
+
+class IndiceUnion:
+    # """
+    # Índice reutilizable del lado derecho de una unión: codifica la columna clave a códigos enteros
+    # una sola vez y guarda, por código, dónde empiezan sus filas y cuántas son. Se construye con
+    # construir_indice y se pasa a unir_dataframes(indice=...) en cada unión contra la misma tabla.
+
+    # Args:
+    #     df (pd.DataFrame): Tabla derecha.
+    #     columna (str): Columna clave.
+    # """
+
+    def __init__(self, df, columna):
+        self.df = df
+        self.columna = columna
+
+        # Los nulos reciben su propio código: pd.merge también une nulo con nulo
+        codificado = pc.dictionary_encode(_claves_arrow(df[columna]), null_encoding="encode")
+        self.unicos = codificado.dictionary
+        codigos = codificado.indices.to_numpy(zero_copy_only=False)
+
+        self.conteos = np.bincount(codigos, minlength=len(self.unicos))
+        self.inicios = np.cumsum(self.conteos) - self.conteos
+        # Si la tabla ya viene ordenada por la clave los códigos salen agrupados y no hay que ordenar
+        self.ordenado = bool(np.all(codigos[1:] >= codigos[:-1]))
+        self.orden = np.arange(len(codigos)) if self.ordenado else np.argsort(codigos, kind="stable")
+
+    def codificar(self, claves):
+        # """
+        # Códigos de las claves de la tabla izquierda en el diccionario del índice (-1 = sin match).
+        # """
+        codigos = pc.index_in(_claves_arrow(claves), value_set=self.unicos, skip_nulls=False)
+        return pc.fill_null(codigos, -1).to_numpy(zero_copy_only=False)
+
+    def ubicar(self, claves):
+        # """
+        # Para cada clave de la tabla izquierda devuelve (inicio, conteo) dentro de self.orden.
+        # """
+        codigos = claves if isinstance(claves, np.ndarray) else self.codificar(claves)
+        encontrados = codigos >= 0
+        inicios = np.zeros(len(codigos), dtype=np.int64)
+        conteos = np.zeros(len(codigos), dtype=np.int64)
+        inicios[encontrados] = self.inicios[codigos[encontrados]]
+        conteos[encontrados] = self.conteos[codigos[encontrados]]
+        return inicios, conteos
+
+
+def construir_indice(df, columna):
+    # """
+    # Construye el índice de la tabla derecha para reutilizarlo en varias uniones.
+
+    # Args:
+    #     df (pd.DataFrame): Tabla derecha (p.ej. bancos).
+    #     columna (str): Columna clave (p.ej. "Merge_Key").
+
+    # Returns:
+    #     IndiceUnion
+    # """
+    return IndiceUnion(df, columna)
+
+
+_VALIDACIONES = {
+    "one_to_one": (True, True), "1:1": (True, True),
+    "one_to_many": (True, False), "1:m": (True, False),
+    "many_to_one": (False, True), "m:1": (False, True),
+    "many_to_many": (False, False), "m:m": (False, False),
+}
+
+
+def diagnosticar_union(df_1, df_2, col1, col2, tipo_union="left", indice=None, top=10):
+    # """
+    # Revisa la cardinalidad de una unión antes de materializarla, usando solo conteos por clave:
+    # porcentaje de filas de df_1 con match, claves sin match, filas que tendría el resultado y
+    # las claves que más lo multiplican (p.ej. Document Number duplicado en BANCOS).
+
+    # Args:
+    #     df_1, df_2, col1, col2, tipo_union: Igual que en unir_dataframes.
+    #     indice (IndiceUnion, optional): Índice de df_2 ya construido.
+    #     top (int): Cuántas claves sin match y de mayor fan-out reportar.
+
+    # Returns:
+    #     dict: filas_izq, filas_der, tasa_match, claves_sin_match, muestra_sin_match, filas_estimadas,
+    #         fanout_max, izq_unica, der_unica y peores (DataFrame clave / filas_izq / filas_der / filas_resultado).
+    # """
+    try:
+        indice = indice or construir_indice(df_2, col2)
+        codigos = indice.codificar(df_1[col1])
+    except pa.ArrowException:
+        # Claves de tipos mezclados (p.ej. int y str en una columna object) no se codifican en Arrow
+        return _diagnosticar_pandas(df_1, df_2, col1, col2, tipo_union, top)
+    hay_match = codigos >= 0
+
+    # Filas de cada lado por código del diccionario
+    conteo_izq = np.bincount(codigos[hay_match], minlength=len(indice.unicos))
+    conteo_der = indice.conteos
+    por_clave = conteo_izq * conteo_der
+    der_sin_match = int(conteo_der[conteo_izq == 0].sum())
+    izq_sin_match = int((~hay_match).sum())
+
+    filas_estimadas = {
+        "inner": int(por_clave.sum()),
+        "left": int(por_clave.sum()) + izq_sin_match,
+        "right": int(por_clave.sum()) + der_sin_match,
+        "outer": int(por_clave.sum()) + izq_sin_match + der_sin_match,
+    }.get(tipo_union)
+
+    sin_match = df_1[col1][~hay_match]
+    usados = np.flatnonzero(conteo_izq)
+    peores = usados[np.argsort(-por_clave[usados], kind="stable")][:top]
+    peores = pd.DataFrame({
+        "clave": indice.unicos.take(pa.array(peores)).to_pylist(),
+        "filas_izq": conteo_izq[peores],
+        "filas_der": conteo_der[peores],
+        "filas_resultado": por_clave[peores],
+    })
+
+    return {
+        "filas_izq": len(df_1),
+        "filas_der": len(df_2),
+        "tasa_match": float(hay_match.mean()) if len(df_1) else 0.0,
+        "claves_sin_match": int(sin_match.nunique(dropna=False)),
+        "muestra_sin_match": sin_match.drop_duplicates().head(top).tolist(),
+        "filas_estimadas": filas_estimadas,
+        "fanout_max": int(conteo_der[usados].max()) if len(usados) else 0,
+        "izq_unica": not df_1[col1].duplicated().any(),
+        "der_unica": bool(conteo_der.max(initial=0) <= 1),
+        "peores": peores,
+    }
+
+
+def _diagnosticar_pandas(df_1, df_2, col1, col2, tipo_union, top):
+    # Mismo diagnóstico que diagnosticar_union con conteos de pandas (mismas reglas de igualdad que pd.merge)
+    conteo_izq = df_1[col1].value_counts(dropna=False, sort=False)
+    conteo_der = df_2[col2].value_counts(dropna=False, sort=False)
+    comunes = conteo_der.index[conteo_der.index.isin(conteo_izq.index)]
+    por_clave = conteo_izq.reindex(comunes) * conteo_der.reindex(comunes)
+    izq_sin_match = len(df_1) - int(conteo_izq.reindex(comunes).sum())
+    der_sin_match = len(df_2) - int(conteo_der.reindex(comunes).sum())
+
+    filas_estimadas = {
+        "inner": int(por_clave.sum()),
+        "left": int(por_clave.sum()) + izq_sin_match,
+        "right": int(por_clave.sum()) + der_sin_match,
+        "outer": int(por_clave.sum()) + izq_sin_match + der_sin_match,
+    }.get(tipo_union)
+
+    hay_match = df_1[col1].isin(comunes)
+    sin_match = df_1[col1][~hay_match]
+    peores = por_clave.sort_values(ascending=False, kind="stable").head(top)
+    peores = pd.DataFrame({
+        "clave": peores.index.tolist(),
+        "filas_izq": conteo_izq.reindex(peores.index).to_numpy(),
+        "filas_der": conteo_der.reindex(peores.index).to_numpy(),
+        "filas_resultado": peores.to_numpy(),
+    })
+
+    return {
+        "filas_izq": len(df_1),
+        "filas_der": len(df_2),
+        "tasa_match": float(hay_match.mean()) if len(df_1) else 0.0,
+        "claves_sin_match": int(sin_match.nunique(dropna=False)),
+        "muestra_sin_match": sin_match.drop_duplicates().head(top).tolist(),
+        "filas_estimadas": filas_estimadas,
+        "fanout_max": int(conteo_der.reindex(comunes).max()) if len(comunes) else 0,
+        "izq_unica": not df_1[col1].duplicated().any(),
+        "der_unica": bool(conteo_der.max() <= 1) if len(conteo_der) else True,
+        "peores": peores,
+    }
+
+
+def _reportar_union(diagnostico, col1, col2):
+    d = diagnostico
+    print(f"  [OK] Diagnóstico {col1} -> {col2}: match {d['tasa_match']:.1%} de {d['filas_izq']} filas, "
+          f"{d['claves_sin_match']} claves sin match, filas estimadas: {d['filas_estimadas']}, fan-out máx: {d['fanout_max']}")
+    if d["muestra_sin_match"]:
+        print(f"  [WARN] Claves sin match (muestra): {d['muestra_sin_match']}")
+    if d["fanout_max"] > 1:
+        peores = d["peores"][d["peores"]["filas_der"] > 1]
+        print("  [WARN] Claves que multiplican filas:")
+        print(peores.to_string(index=False))
+
+
+def posiciones_union(claves, indice, tipo_union="left", max_fanout=None):
+    # """
+    # Posiciones de filas de cada lado que forman una unión 'left' o 'inner' contra el índice,
+    # en el mismo orden que pd.merge. Con max_fanout cada fila izquierda toma como máximo esa
+    # cantidad de filas derechas (las primeras).
+
+    # Args:
+    #     claves (pd.Series | pa.Array): Columna clave de la tabla izquierda.
+    #     indice (IndiceUnion): Índice de la tabla derecha.
+
+    # Returns:
+    #     tuple: (pos_izq, pos_der) como np.ndarray; pos_der es -1 donde no hubo match.
+    # """
+    inicios, conteos = indice.ubicar(claves)
+    if max_fanout is not None:
+        conteos = np.minimum(conteos, max_fanout)
+
+    repeticiones = np.maximum(conteos, 1) if tipo_union == "left" else conteos
+    pos_izq = np.repeat(np.arange(len(claves)), repeticiones)
+    desplazamiento = np.arange(len(pos_izq)) - np.repeat(np.cumsum(repeticiones) - repeticiones, repeticiones)
+    hay_match = np.repeat(conteos, repeticiones) > 0
+    pos_der = np.full(len(pos_izq), -1, dtype=np.int64)
+    pos_der[hay_match] = indice.orden[np.repeat(inicios, repeticiones)[hay_match] + desplazamiento[hay_match]]
+    return pos_izq, pos_der
+
+
+def _unir_por_codigos(df_1, col1, indice, tipo_union, max_fanout=None):
+    # Une con los códigos del índice y arma el resultado con take
+    df_2, col2 = indice.df, indice.columna
+    pos_izq, pos_der = posiciones_union(df_1[col1], indice, tipo_union, max_fanout)
+
+    izquierda = df_1.take(pos_izq).reset_index(drop=True)
+    derecha = df_2.reset_index(drop=True)
+    if col1 == col2:
+        # Igual que pd.merge: con el mismo nombre la clave queda una sola vez
+        derecha = derecha.drop(columns=[col2])
+    # Las posiciones -1 (sin match) quedan como filas nulas
+    derecha = derecha.reindex(pos_der).reset_index(drop=True)
+    derecha.columns = [f"{col}_sec" if col in izquierda.columns else col for col in derecha.columns]
+    return pd.concat([izquierda, derecha], axis=1)
+
+
+def unir_dataframes(df_1, df_2, col1, col2, tipo_union="left", rapido=False, indice=None,
+                    validate=None, max_fanout=None, al_exceder="error"):
     # """
     # Une dos DataFrames usando columnas clave.
 
@@ -152,19 +454,76 @@ def unir_dataframes(df_1, df_2, col1, col2, tipo_union="left"):
     #     columna_maestro (str)
     #     columna_secundario (str)
     #     tipo_union (str)
+    #     rapido (bool): Si True, une con claves codificadas a enteros (solo 'left' e 'inner';
+    #         el resto usa pd.merge). Mismo resultado y orden de filas que pd.merge.
+    #     indice (IndiceUnion, optional): Índice de df_2 ya construido con construir_indice;
+    #         implica rapido=True.
+    #     Sin rapido ni indice se une con pd.merge aunque se pida validate o max_fanout. Si las claves
+    #     no se pueden codificar en Arrow (tipos mezclados) rapido también cae a pd.merge.
+    #     validate (str, optional): Como en pd.merge ('one_to_one', 'one_to_many', 'many_to_one',
+    #         'many_to_many' o '1:1', '1:m', 'm:1', 'm:m'), pero se revisa antes de unir.
+    #     max_fanout (int, optional): Máximo de filas de df_2 por clave de df_1.
+    #     al_exceder (str): Qué hacer si se excede max_fanout: 'error' no une (devuelve None);
+    #         'muestra' une tomando solo las primeras max_fanout filas de df_2 por clave.
+    #     Con validate o max_fanout se imprime el diagnóstico de diagnosticar_union antes de unir.
 
     # Returns:
     #     pd.DataFrame
     # """
     try:
-        df_unido = pd.merge(
-            df_1,
-            df_2,
-            left_on=col1,
-            right_on=col2,
-            how=tipo_union,
-            suffixes=('', '_sec')
-        )
+        if indice is not None:
+            if indice.df is not df_2 or indice.columna != col2:
+                raise ValueError(f"el índice no corresponde a la tabla derecha / columna '{col2}'")
+            rapido = True
+
+        tope = None
+        if validate is not None or max_fanout is not None:
+            if validate is not None and validate not in _VALIDACIONES:
+                raise ValueError(f"validate='{validate}' no es válido. Usa {list(_VALIDACIONES)}")
+            if al_exceder not in ("error", "muestra"):
+                raise ValueError("al_exceder debe ser 'error' o 'muestra'.")
+
+            if rapido and indice is None:
+                # El índice del diagnóstico se reutiliza para unir
+                try:
+                    indice = construir_indice(df_2, col2)
+                except pa.ArrowException:
+                    pass
+            diagnostico = diagnosticar_union(df_1, df_2, col1, col2, tipo_union, indice=indice)
+            _reportar_union(diagnostico, col1, col2)
+
+            izq_unica, der_unica = _VALIDACIONES.get(validate, (False, False))
+            if izq_unica and not diagnostico["izq_unica"]:
+                raise ValueError(f"validate='{validate}': '{col1}' tiene claves duplicadas en la tabla izquierda")
+            if der_unica and not diagnostico["der_unica"]:
+                raise ValueError(f"validate='{validate}': '{col2}' tiene claves duplicadas en la tabla derecha")
+
+            if max_fanout is not None and diagnostico["fanout_max"] > max_fanout:
+                if al_exceder == "error":
+                    raise ValueError(
+                        f"fan-out {diagnostico['fanout_max']} > max_fanout={max_fanout}; "
+                        f"el resultado tendría {diagnostico['filas_estimadas']} filas")
+                print(f"  [WARN] Se toman solo las primeras {max_fanout} filas de df_2 por clave.")
+                tope = max_fanout
+
+        df_unido = None
+        if rapido and tipo_union in ("left", "inner"):
+            try:
+                df_unido = _unir_por_codigos(df_1, col1, indice or construir_indice(df_2, col2),
+                                             tipo_union, max_fanout=tope)
+            except pa.ArrowException as e:
+                print(f"  [WARN] Claves no codificables en Arrow ({e}); se une con pd.merge.")
+        if df_unido is None:
+            if tope is not None:
+                df_2 = df_2[df_2.groupby(col2, dropna=False, sort=False).cumcount() < tope]
+            df_unido = pd.merge(
+                df_1,
+                df_2,
+                left_on=col1,
+                right_on=col2,
+                how=tipo_union,
+                suffixes=('', '_sec')
+            )
         print(f"  [OK] Union completada. Filas: {len(df_unido)}")
         return df_unido
     except Exception as e:
@@ -206,20 +565,44 @@ def manejar_columnas(df, columnas, mode="remove"):
         return df[columnas_existentes]
 
 
-def crear_columna(df, nombre_columna, funcion_condicional):
+def _aplicar_bloque(bloque, funcion_condicional):
+    # Nivel de módulo para que ProcessPoolExecutor pueda enviarla a otro proceso
+    return bloque.apply(funcion_condicional, axis=1)
+
+
+def crear_columna(df, nombre_columna, funcion_condicional, workers=None, filas_por_bloque=50_000):
     # """
-    # Crea una nueva columna usando una funcin condicional.
+    # Crea una nueva columna usando una función condicional fila por fila.
+    # Para reglas que se pueden expresar por columnas usar columna_por_reglas, columna_por_mapeo
+    # o columna_por_texto, que son mucho más rápidas.
 
     # Args:
     #     df (pd.DataFrame): DataFrame original.
     #     nombre_columna (str): Nombre de la nueva columna.
-    #     funcion_condicional (function): Funcin que reciba una fila y devuelva un valor.
+    #     funcion_condicional (function): Función que reciba una fila y devuelva un valor.
+    #     workers (int, optional): Procesos para aplicar la función por bloques en paralelo
+    #         (None o 1 = en el mismo proceso). La función debe estar definida a nivel de módulo
+    #         (no lambda); si no se puede enviar a otro proceso se aplica en serie.
+    #     filas_por_bloque (int): Filas por bloque cuando se usa workers.
 
     # Returns:
     #     pd.DataFrame: DataFrame con la nueva columna.
     # """
     try:
-        df[nombre_columna] = df.apply(funcion_condicional, axis=1)
+        if workers and workers > 1 and len(df) > filas_por_bloque:
+            # Se revisa una sola vez antes de abrir el pool; los errores de la función en los
+            # procesos no se confunden con que no se pueda enviar
+            try:
+                pickle.dumps(funcion_condicional)
+            except (AttributeError, TypeError, pickle.PicklingError) as e:
+                print(f" [WARN] '{nombre_columna}': la función no se puede usar en paralelo ({e}); se aplica en serie.")
+                workers = None
+        if workers and workers > 1 and len(df) > filas_por_bloque:
+            bloques = [df.iloc[i:i + filas_por_bloque] for i in range(0, len(df), filas_por_bloque)]
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                df[nombre_columna] = pd.concat(pool.map(_aplicar_bloque, bloques, [funcion_condicional] * len(bloques)))
+        else:
+            df[nombre_columna] = df.apply(funcion_condicional, axis=1)
         print(f" [OK] Columna '{nombre_columna}' creada.")
         return df
     except Exception as e:
@@ -227,9 +610,316 @@ def crear_columna(df, nombre_columna, funcion_condicional):
         return df
 
 
-def guardar_dataframe(df, carpeta_base, subcarpeta, nombre_archivo, formato='parquet'):
+def _evaluar(df, valor):
+    # Valores de las reglas: función df -> serie, serie o escalar
+    valor = valor(df) if callable(valor) else valor
+    return valor.to_numpy(dtype=object) if isinstance(valor, pd.Series) else valor
+
+
+def columna_por_reglas(df, nombre_columna, reglas, default=None):
+    # """
+    # Crea una columna a partir de condiciones y valores, como np.select: cada fila toma el valor de la
+    # primera condición que cumple y, si no cumple ninguna, default. Se evalúa por columnas completas.
+
+    # Ejemplo:
+    #     columna_por_reglas(df, "Tipo", [
+    #         (lambda d: d["Filtro1"].eq("S") & d["Filtro2"].eq("D"), "Depósito"),
+    #         (lambda d: d["Filtro1"].eq("H"), "Retiro"),
+    #     ], default="Otro")
+
+    # Args:
+    #     df (pd.DataFrame): DataFrame original.
+    #     nombre_columna (str): Nombre de la nueva columna.
+    #     reglas (list): Pares (condición, valor). La condición es una serie booleana o una función
+    #         df -> serie booleana (los nulos cuentan como False). El valor es un escalar, una serie
+    #         o una función df -> serie (p.ej. lambda d: d["Importe"]).
+    #     default: Valor cuando ninguna condición se cumple (escalar, serie o función).
+
+    # Returns:
+    #     pd.DataFrame: DataFrame con la nueva columna.
+    # """
+    try:
+        condiciones = []
+        valores = []
+        for condicion, valor in reglas:
+            condicion = condicion(df) if callable(condicion) else condicion
+            condiciones.append(pd.Series(condicion, index=df.index).fillna(False).to_numpy(dtype=bool))
+            valores.append(_evaluar(df, valor))
+        resultado = np.select(condiciones, valores, default=_evaluar(df, default)) if condiciones else \
+            np.broadcast_to(np.asarray(_evaluar(df, default), dtype=object), len(df))
+        df[nombre_columna] = pd.Series(resultado, index=df.index).infer_objects()
+        print(f" [OK] Columna '{nombre_columna}' creada.")
+        return df
+    except Exception as e:
+        print(f" [Error] creando columna '{nombre_columna}': {e}")
+        return df
+
+
+def columna_por_mapeo(df, nombre_columna, columna, mapeo, clave=None, valor=None, default=None):
+    # """
+    # Crea una columna buscando los valores de otra en una tabla de equivalencias (tipo BUSCARV).
+
+    # Args:
+    #     df (pd.DataFrame): DataFrame original.
+    #     nombre_columna (str): Nombre de la nueva columna.
+    #     columna (str): Columna de df con los valores a buscar.
+    #     mapeo (dict | pd.Series | pd.DataFrame): Equivalencias. Si es DataFrame se usan sus columnas
+    #         clave y valor; si una clave se repite se toma la primera.
+    #     clave (str, optional): Columna de mapeo con las claves (solo DataFrame).
+    #     valor (str, optional): Columna de mapeo con los valores (solo DataFrame).
+    #     default: Valor para las claves que no están en el mapeo (None = nulo).
+
+    # Returns:
+    #     pd.DataFrame: DataFrame con la nueva columna.
+    # """
+    try:
+        if isinstance(mapeo, pd.DataFrame):
+            if clave is None or valor is None:
+                raise ValueError("Con un DataFrame de mapeo se deben indicar 'clave' y 'valor'.")
+            mapeo = mapeo.drop_duplicates(subset=clave).set_index(clave)[valor]
+        resultado = df[columna].map(mapeo)
+        if default is not None:
+            resultado = resultado.fillna(default)
+        df[nombre_columna] = resultado
+        sin_match = int(resultado.isna().sum() - df[columna].isna().sum()) if default is None else 0
+        print(f" [OK] Columna '{nombre_columna}' creada." + (f" Sin equivalencia: {sin_match} filas." if sin_match > 0 else ""))
+        return df
+    except Exception as e:
+        print(f" [Error] creando columna '{nombre_columna}': {e}")
+        return df
+
+
+def columna_por_texto(df, nombre_columna, partes, separador=""):
+    # """
+    # Crea una columna de texto concatenando columnas, recortes de columnas y textos fijos.
+    # Los nulos se toman como texto vacío.
+
+    # Ejemplo:
+    #     columna_por_texto(df, "Referencia", [("Merge_Key_Aux", 0, 10), "-", "Moneda"])
+
+    # Args:
+    #     df (pd.DataFrame): DataFrame original.
+    #     nombre_columna (str): Nombre de la nueva columna.
+    #     partes (list): Cada parte es un nombre de columna, una tupla (columna, inicio, fin) para
+    #         recortar como en Python (fin puede ser None) o un texto fijo (si no es columna de df).
+    #     separador (str): Texto entre partes.
+
+    # Returns:
+    #     pd.DataFrame: DataFrame con la nueva columna.
+    # """
+    try:
+        resultado = None
+        for parte in partes:
+            if isinstance(parte, tuple):
+                nombre, inicio, fin = parte
+                texto = df[nombre].astype("string").fillna("").str.slice(inicio, fin)
+            elif parte in df.columns:
+                texto = df[parte].astype("string").fillna("")
+            else:
+                texto = str(parte)
+            if resultado is None:
+                resultado = texto
+            else:
+                resultado = resultado + separador + texto
+        if not isinstance(resultado, pd.Series):
+            resultado = pd.Series(resultado or "", index=df.index, dtype="string")
+        df[nombre_columna] = resultado
+        print(f" [OK] Columna '{nombre_columna}' creada.")
+        return df
+    except Exception as e:
+        print(f" [Error] creando columna '{nombre_columna}': {e}")
+        return df
+
+
+FILAS_POR_GRUPO = 128 * 1024
+
+
+def _columnas_diccionario(tabla, proporcion=0.5):
+    # Columnas de texto con pocos valores distintos (moneda, tipo de documento, banco...): ahí el
+    # diccionario reduce el archivo; en llaves casi únicas solo agrega trabajo
+    columnas = []
+    for nombre, columna in zip(tabla.column_names, tabla.columns):
+        tipo = columna.type
+        if not (pa.types.is_string(tipo) or pa.types.is_large_string(tipo) or pa.types.is_binary(tipo)
+                or pa.types.is_dictionary(tipo)):
+            continue
+        if tabla.num_rows == 0 or pc.count_distinct(columna).as_py() <= proporcion * tabla.num_rows:
+            columnas.append(nombre)
+    return columnas
+
+
+def _escribir_parquet(df, ruta, compresion="zstd", nivel=None, filas_por_grupo=FILAS_POR_GRUPO,
+                      diccionario="auto", ordenar_por=None, esquema=None):
+    # """
+    # Escribe un parquet con opciones ajustables (ver guardar_dataframe). esquema fija los tipos
+    # (p.ej. el común a todas las particiones de un dataset).
+    # """
+    tabla = pa.Table.from_pandas(df, schema=esquema, preserve_index=False)
+
+    ordenamiento = None
+    if ordenar_por:
+        ordenar_por = [ordenar_por] if isinstance(ordenar_por, str) else list(ordenar_por)
+        tabla = tabla.sort_by([(col, "ascending") for col in ordenar_por])
+        # Queda registrado en el footer para que los lectores sepan que viene ordenado
+        ordenamiento = [pq.SortingColumn(tabla.column_names.index(col)) for col in ordenar_por]
+
+    if diccionario == "auto":
+        diccionario = _columnas_diccionario(tabla)
+
+    pq.write_table(
+        tabla,
+        ruta,
+        compression=compresion,
+        compression_level=nivel,
+        row_group_size=filas_por_grupo,
+        use_dictionary=diccionario,
+        sorting_columns=ordenamiento,
+    )
+
+
+def escribir_archivo(df, ruta, formato, **opciones):
     # """
-    # Guarda un DataFrame en formato parquet o csv.
+    # Escribe un DataFrame a un nombre temporal oculto junto al destino ("." + nombre + ".tmp") y lo
+    # renombra al terminar, así un lector (u OneDrive) nunca ve un archivo a medias. Si falla se borra
+    # el temporal; si quedara uno (proceso terminado a la fuerza) ds.dataset lo ignora por el punto.
+
+    # Args:
+    #     df (pd.DataFrame): DataFrame a escribir.
+    #     ruta (str): Ruta final.
+    #     formato (str): 'parquet', 'csv' o 'xlsx' (layout con el formato de Guardar_Formato).
+    #     **opciones: Para 'parquet', las de guardar_dataframe (compresion, nivel, filas_por_grupo,
+    #         diccionario, ordenar_por); para 'xlsx', hoja y filas_por_bloque.
+
+    # Returns:
+    #     Para 'xlsx' el número de hojas escritas; None en los demás formatos.
+    # """
+    carpeta, nombre = os.path.split(ruta)
+    temporal = os.path.join(carpeta, f".{nombre}.tmp")
+    try:
+        if formato == 'parquet':
+            resultado = _escribir_parquet(df, temporal, **opciones)
+        elif formato == 'csv':
+            resultado = df.to_csv(temporal, index=False)
+        elif formato == 'xlsx':
+            resultado = _escribir_excel(df, temporal, **opciones)
+        else:
+            raise ValueError("Formato no soportado. Usa 'parquet', 'csv' o 'xlsx'.")
+        os.replace(temporal, ruta)
+        return resultado
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+COLUMNAS_PERIODO = ("Fecha de emisión", "Document Date")
+PARTICION_NULA = "__HIVE_DEFAULT_PARTITION__"
+
+
+def _guardar_particionado(df, ruta_dataset, compania, columna_fecha=None, **opciones):
+    # """
+    # Guarda df como dataset Hive ruta_dataset/compania=X/anio=AAAA/mes=MM/part-0.parquet. Solo se
+    # reemplazan las particiones (compañía, año, mes) presentes en df; las demás no se tocan.
+    # Cada partición se escribe con escribir_archivo (temporal + rename). Las filas sin fecha
+    # van a la partición nula de Hive.
+
+    # Returns:
+    #     list: Carpetas de partición escritas.
+    # """
+    if columna_fecha is None:
+        columna_fecha = next((col for col in COLUMNAS_PERIODO if col in df.columns), None)
+    if columna_fecha not in df.columns:
+        raise ValueError(f"No hay columna de fecha para particionar; usa columna_fecha= (p.ej. {list(COLUMNAS_PERIODO)})")
+    if compania is None or "/" in str(compania) or "\\" in str(compania):
+        raise ValueError("Para particionar se requiere compania= (sin diagonales).")
+
+    # Un solo esquema para todas las particiones, unificado con el del dataset existente: si cada
+    # mes infiriera el suyo, una columna toda nula en un mes quedaría con tipo null
+    esquema = pa.Schema.from_pandas(df, preserve_index=False)
+    if os.path.isdir(ruta_dataset):
+        previo = esquema_dataset(ruta_dataset)
+        previo = pa.schema([campo for campo in previo if campo.name not in COLUMNAS_PARTICION])
+        esquema = pa.unify_schemas([previo, esquema], promote_options="permissive")
+    esquema = pa.schema([esquema.field(col) for col in df.columns])
+
+    fechas = pd.to_datetime(df[columna_fecha], errors="coerce")
+    escritas = []
+    for (anio, mes), grupo in df.groupby([fechas.dt.year, fechas.dt.month], dropna=False, sort=True):
+        anio = PARTICION_NULA if pd.isna(anio) else f"{int(anio)}"
+        mes = PARTICION_NULA if pd.isna(mes) else f"{int(mes):02d}"
+        carpeta = os.path.join(ruta_dataset, f"compania={compania}", f"anio={anio}", f"mes={mes}")
+        os.makedirs(carpeta, exist_ok=True)
+        escribir_archivo(grupo, os.path.join(carpeta, "part-0.parquet"), "parquet", esquema=esquema, **opciones)
+
+        # Archivos de una escritura anterior con otro nombre dejarían filas duplicadas
+        for nombre in os.listdir(carpeta):
+            if nombre.endswith(".parquet") and nombre != "part-0.parquet":
+                os.remove(os.path.join(carpeta, nombre))
+        escritas.append(carpeta)
+    return escritas
+
+
+def _exportar_destino(df, formato, ruta):
+    # Tarea de exportar_destinos; devuelve el dict de resultado con el formato de ejecutar_tareas
+    inicio = time.time()
+    try:
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        hojas = escribir_archivo(df, ruta, formato)
+        tamano = os.path.getsize(ruta)
+        mensaje = f"{len(df)} filas" + (f" en {hojas} hojas" if hojas and hojas > 1 else "") + f", {tamano / 1024 ** 2:.1f} MB"
+        return {"archivo": ruta, "estado": "OK", "mensaje": mensaje,
+                "segundos": time.time() - inicio, "bytes": tamano}
+    except Exception as e:
+        return {"archivo": ruta, "estado": "ERROR", "mensaje": f"{type(e).__name__}: {e}",
+                "segundos": time.time() - inicio, "bytes": None}
+
+
+def exportar_destinos(destinos, workers=None, modo="hilos"):
+    # """
+    # Escribe varios DataFrames a la vez (p.ej. Layout_Depósitos y Layout_Retiros en csv y xlsx), así
+    # el tiempo total es el de la escritura más lenta y no la suma. Cada archivo se escribe a un
+    # temporal y se renombra al terminar (escribir_archivo).
+
+    # Args:
+    #     destinos (list): Tuplas (df, formato, ruta) con formato 'parquet', 'csv' o 'xlsx'.
+    #     workers (int, optional): Escrituras simultáneas. None = una por destino, -1 = todos los núcleos.
+    #     modo (str): 'hilos' (sin copiar los DataFrames) o 'procesos' (el xlsx y el csv se formatean
+    #         en Python y con procesos no compiten por el GIL, a cambio de copiar cada DataFrame).
+
+    # Returns:
+    #     list: Un dict por destino {"archivo", "estado", "mensaje", "segundos", "bytes"}, en el orden
+    #         de destinos; se puede imprimir con source_utils.reportar_resultados.
+    # """
+    if modo not in ("hilos", "procesos"):
+        raise ValueError("modo debe ser 'hilos' o 'procesos'.")
+    rutas = [os.path.abspath(ruta) for _, _, ruta in destinos]
+    if len(set(rutas)) != len(rutas):
+        raise ValueError("Hay destinos repetidos; cada ruta debe aparecer una sola vez.")
+
+    if workers == -1:
+        workers = os.cpu_count()
+    workers = workers or len(destinos)
+
+    if workers <= 1 or len(destinos) <= 1:
+        resultados = [_exportar_destino(*destino) for destino in destinos]
+    else:
+        Pool = ThreadPoolExecutor if modo == "hilos" else ProcessPoolExecutor
+        with Pool(max_workers=workers) as pool:
+            futuros = [pool.submit(_exportar_destino, df, formato, ruta) for df, formato, ruta in destinos]
+            resultados = [futuro.result() for futuro in futuros]
+
+    for carpeta in {os.path.dirname(ruta) for _, formato, ruta in destinos if formato == 'parquet'}:
+        invalidar_catalogo(carpeta)
+    return resultados
+
+
+def guardar_dataframe(df, carpeta_base, subcarpeta, nombre_archivo, formato='parquet',
+                      compresion="zstd", nivel=None, filas_por_grupo=FILAS_POR_GRUPO,
+                      diccionario="auto", ordenar_por=None, particionado=False, compania=None,
+                      columna_fecha=None):
+    # """
+    # Guarda un DataFrame en formato parquet o csv. Se escribe a un temporal y se renombra al
+    # terminar, así una caída a media escritura no deja un archivo truncado.
 
     # Parmetros:
     #     df (pd.DataFrame): El DataFrame a guardar.
@@ -237,17 +927,41 @@ def guardar_dataframe(df, carpeta_base, subcarpeta, nombre_archivo, formato='par
     #     subcarpeta (str): Carpeta dentro de la base donde se guardar.
     #     nombre_archivo (str): Nombre del archivo sin extensin.
     #     formato (str): 'parquet' o 'csv'. Por defecto 'parquet'.
+    #     Solo parquet:
+    #     compresion (str): Códec ('zstd', 'snappy', 'gzip', 'brotli', 'lz4', 'none'). Por defecto 'zstd'.
+    #     nivel (int, optional): Nivel de compresión del códec (None = el del códec).
+    #     filas_por_grupo (int): Filas por row group (~128k); grupos más chicos filtran mejor al leer.
+    #     diccionario: 'auto' (columnas de texto con pocos valores distintos), True, False o lista de columnas.
+    #     ordenar_por (str | list, optional): Columna(s) por las que se ordena antes de escribir, p.ej.
+    #         "Merge_Key" o "Fecha de emisión"; así las estadísticas por row group descartan más al filtrar.
+    #     particionado (bool): Si True guarda un dataset Hive carpeta_base/subcarpeta/nombre_archivo/
+    #         compania=.../anio=.../mes=... y solo reemplaza los periodos que vienen en df (un cierre
+    #         mensual reescribe un mes). Se lee con leer_parquet(..., periodos=[...]).
+    #     compania (str): Compañía de la partición (requerida si particionado).
+    #     columna_fecha (str, optional): Columna que define el periodo; por defecto "Fecha de emisión"
+    #         o "Document Date", la que exista.
     # """
     try:
         ruta_carpeta = os.path.join(carpeta_base, subcarpeta)
         os.makedirs(ruta_carpeta, exist_ok=True)
         ruta_completa = os.path.join(ruta_carpeta, f"{nombre_archivo}.{formato}")
+        if formato not in ('parquet', 'csv'):
+            raise ValueError("Formato no soportado. Usa 'parquet' o 'csv'.")
+        opciones = {}
         if formato == 'parquet':
-            df.to_parquet(ruta_completa, index=False)
-        elif formato == 'csv':
-            df.to_csv(ruta_completa, index=False)
+            opciones = dict(compresion=compresion, nivel=nivel, filas_por_grupo=filas_por_grupo,
+                            diccionario=diccionario, ordenar_por=ordenar_por)
+        if particionado:
+            if formato != 'parquet':
+                raise ValueError("Solo se puede particionar en formato parquet.")
+            ruta_completa = os.path.join(ruta_carpeta, nombre_archivo)
+            if os.path.isfile(f"{ruta_completa}.parquet"):
+                print(f"  [WARN] También existe {nombre_archivo}.parquet sin particionar; leer_parquet usará el más reciente.")
+            particiones = _guardar_particionado(df, ruta_completa, compania, columna_fecha, **opciones)
+            print(f"  [OK] Particiones reemplazadas: {len(particiones)}")
         else:
-            raise ValueError("Formato no soportado. Usa 'parquet' o 'csv'.")
+            escribir_archivo(df, ruta_completa, formato, **opciones)
+        invalidar_catalogo(ruta_carpeta)
 
         logging.info(f"Archivo guardado en: {ruta_completa}")
         print(f" [OK] Archivo guardado exitosamente en: {ruta_completa}")
@@ -255,39 +969,109 @@ def guardar_dataframe(df, carpeta_base, subcarpeta, nombre_archivo, formato='par
         logging.error(f"Error al guardar el archivo: {str(e)}")
         print(f" [Error] al guardar el archivo: {e}")
 
-def eliminar_duplicados(df, columna_clave):
+TOKENS_NULOS = ("", "nan", "null", "none")
+
+
+def normalizar_nulos(df, tokens=TOKENS_NULOS):
     # """
-    # Elimina duplicados conservando la fila con más datos no nulos.
+    # Reemplaza por pd.NA los valores vacíos o de texto que representan nulos ("nan", "null", "none")
+    # en una sola pasada vectorizada por columna de texto. Las columnas numéricas y de fecha no se tocan.
 
     # Args:
-    #     df (pd.DataFrame): DataFrame de entrada.
-    #     columna_clave (str): Nombre de la columna para identificar duplicados.
+    #     df (pd.DataFrame): DataFrame de entrada (no se modifica).
+    #     tokens (iterable): Valores que se consideran nulos, comparados sin espacios y en minúsculas.
+    #         "" cubre las celdas vacías o solo con espacios.
 
     # Returns:
-    #     pd.DataFrame: DataFrame sin duplicados.
+    #     pd.DataFrame: DataFrame con los nulos normalizados.
     # """
-    try:
-        # Reemplazar strings vacíos por NaN (si los hay)
-        df.replace(r"^\s*$", pd.NA, regex=True, inplace=True)
+    tokens = [str(t).strip().lower() for t in tokens]
+    df = df.copy(deep=False)
 
-        # Contar valores no nulos por fila
-        df["_non_null_count"] = df.notnull().sum(axis=1)
+    for col in df.columns:
+        serie = df[col]
+        if not (serie.dtype == object or isinstance(serie.dtype, pd.StringDtype)):
+            continue
+        try:
+            es_nulo = serie.str.strip().str.lower().isin(tokens).fillna(False).astype(bool)
+        except AttributeError:
+            # Columna object sin texto (p.ej. Decimal leídos de parquet)
+            continue
+        if es_nulo.any():
+            df[col] = serie.where(~es_nulo, pd.NA)
 
-        # Ordenar para priorizar filas con más datos
-        df = df.sort_values(by=[columna_clave, "_non_null_count"], ascending=[True, False])
+    return df
 
-        # Eliminar duplicados, conservando el que tenga más datos
-        df = df.drop_duplicates(subset=columna_clave, keep="first")
+def eliminar_duplicados(df, columna_clave, desempate=None, reporte=False):
+    # """
+    # Elimina duplicados conservando la fila con más datos no nulos. Sin ordenar el DataFrame: se cuenta
+    # cuántos datos tiene cada fila y por clave se queda la de mayor conteo (lineal en el número de filas).
+    # El resultado conserva el orden original de las filas que quedan.
 
-        # Eliminar columna auxiliar
-        df.drop(columns=["_non_null_count"], inplace=True)
+    # Args:
+    #     df (pd.DataFrame): DataFrame de entrada (no se modifica).
+    #     columna_clave (str): Nombre de la columna para identificar duplicados.
+    #     desempate (list | dict, optional): Columnas para desempatar filas igual de completas; se prefiere
+    #         el valor mayor (p.ej. la fecha más reciente). Con un dict {columna: "max" | "min"} se elige
+    #         el criterio. Si sigue el empate se queda la primera fila.
+    #     reporte (bool): Si True devuelve también un DataFrame con las claves colapsadas
+    #         (columna_clave, filas, eliminadas), de mayor a menor.
 
-        print(f" [OK] Duplicados eliminados usando la columna '{columna_clave}'.")
-        return df
+    # Returns:
+    #     pd.DataFrame: DataFrame sin duplicados (o (DataFrame, reporte) si reporte=True).
+    # """
+    try:
+        # Strings vacíos como nulos (copia superficial; el df original no cambia)
+        df = normalizar_nulos(df, tokens=("",))
+
+        # Datos no nulos por fila, columna por columna
+        completitud = np.zeros(len(df), dtype=np.int64)
+        for col in df.columns:
+            completitud += df[col].notna().to_numpy(dtype=np.int64)
+
+        # Clave como código entero; los nulos forman un grupo, igual que drop_duplicates
+        codigos, unicos = pd.factorize(df[columna_clave], use_na_sentinel=False)
+
+        # Candidatas: filas con el máximo de su grupo; cada desempate reduce las candidatas
+        criterios = [(pd.Series(completitud), "max")]
+        if isinstance(desempate, dict):
+            criterios += [(df[col].reset_index(drop=True), criterio) for col, criterio in desempate.items()]
+        elif desempate:
+            criterios += [(df[col].reset_index(drop=True), "max") for col in ([desempate] if isinstance(desempate, str) else desempate)]
+
+        candidatas = np.ones(len(df), dtype=bool)
+        for valores, criterio in criterios:
+            if criterio not in ("max", "min"):
+                raise ValueError(f"Criterio de desempate no válido: {criterio}. Usa 'max' o 'min'.")
+            posiciones = np.flatnonzero(candidatas)
+            sub = valores.iloc[posiciones]
+            mejor = sub.groupby(codigos[posiciones]).transform(criterio)
+            # Si todo el grupo es nulo en la columna no se descarta ninguna
+            gana = (sub.eq(mejor) | mejor.isna()).fillna(False).to_numpy(dtype=bool)
+            candidatas[posiciones[~gana]] = False
+
+        # Entre las que empatan en todo, la primera de cada clave
+        posiciones = np.flatnonzero(candidatas)
+        conservar = posiciones[~pd.Series(codigos[posiciones]).duplicated().to_numpy()]
+        resultado = df.iloc[conservar]
+
+        conteos = np.bincount(codigos, minlength=len(unicos))
+        eliminadas = len(df) - len(resultado)
+        print(f" [OK] Duplicados eliminados usando la columna '{columna_clave}': {eliminadas} filas en {int((conteos > 1).sum())} claves.")
+
+        if reporte:
+            repetidas = np.flatnonzero(conteos > 1)
+            detalle = pd.DataFrame({
+                columna_clave: unicos.take(repetidas),
+                "filas": conteos[repetidas],
+                "eliminadas": conteos[repetidas] - 1,
+            }).sort_values("filas", ascending=False, kind="stable").reset_index(drop=True)
+            return resultado, detalle
+        return resultado
 
     except Exception as e:
         print(f" [Error] eliminando duplicados: {e}")
-        return df
+        return (df, None) if reporte else df
 
 def eliminar_sufijo(df, sufijo="_sec"):
     # """
@@ -348,39 +1132,100 @@ def clean_dataframe_headers(df, prefix=""):
     
     return df
 
-def convert_to_datetime_with_threshold(df, threshold=0.3):
+# Formatos de fecha que se prueban al inferir una columna (SAP exporta %d.%m.%Y)
+FORMATOS_FECHA = (
+    "%d.%m.%Y", "%d/%m/%Y", "%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%d/%m/%Y %H:%M:%S",
+    "%d.%m.%Y %H:%M:%S", "%m/%d/%Y", "%d-%m-%Y", "%Y/%m/%d", "%Y%m%d", "%Y-%m-%dT%H:%M:%S",
+)
+
+def _inferir_formato(muestra, formatos, previo=None):
+    # Devuelve (formato, proporción válida en la muestra). formato None = sin formato explícito.
+    # Se prueban todos los formatos: si varios convierten la misma proporción (p.ej. "%d/%m/%Y" y
+    # "%m/%d/%Y" cuando ningún día pasa de 12) gana previo si está entre ellos y si no el primero de
+    # formatos, así un formato recordado nunca se impone a uno que convierte más valores.
+    proporciones = {}
+    for formato in dict.fromkeys(formatos):
+        proporciones[formato] = pd.to_datetime(muestra, format=formato, errors="coerce").notna().mean()
+    proporcion = max(proporciones.values(), default=0.0)
+    if proporcion > 0:
+        empatados = [formato for formato, p in proporciones.items() if p == proporcion]
+        return (previo if previo in empatados else empatados[0]), proporcion
+
+    # Formato no listado: que pandas lo adivine con el primer valor (debe tener día y mes;
+    # un "1000" o "2024" suelto no es una fecha)
+    mejor = guess_datetime_format(str(muestra.iloc[0]), dayfirst=True)
+    if mejor and "%d" in mejor and ("%m" in mejor or "%b" in mejor or "%B" in mejor):
+        return mejor, pd.to_datetime(muestra, format=mejor, errors="coerce").notna().mean()
+    return None, 0.0
+
+
+def convert_to_datetime_with_threshold(df, threshold=0.3, muestra=1000, formatos=FORMATOS_FECHA,
+                                       formatos_columna=None):
+    # """
+    # Convierte a fecha (normalizada a medianoche) las columnas en las que al menos threshold de los
+    # valores no vacíos son fechas. Primero se decide con una muestra y se infiere un formato explícito
+    # por columna (p.ej. "%d.%m.%Y"); solo las columnas que califican se convierten completas con ese
+    # formato. Las columnas numéricas no se consideran fechas.
+
+    # Args:
+    #     df (pd.DataFrame): DataFrame a convertir (se modifica).
+    #     threshold (float): Proporción mínima de fechas válidas.
+    #     muestra (int): Valores no vacíos que se revisan antes de convertir la columna completa.
+    #     formatos (tuple): Formatos a probar; si varios convierten igual de bien gana el primero.
+    #     formatos_columna (dict, optional): {columna: formato} de una fuente (p.ej. de la corrida
+    #         anterior del mismo reporte). Solo desempata entre formatos que convierten la misma
+    #         proporción y se actualiza con los formatos elegidos en esta llamada.
+
+    # Returns:
+    #     tuple: (df, columnas no convertidas)
+    # """
     try:
         unconverted_columns = []  # Lista para almacenar las columnas que no se convierten
         for column in df.columns:
-            # Intentamos convertir todos los valores a datetime, estableciendo errores como 'coerce'.
-            converted = pd.to_datetime(df[column], errors='coerce')
-            
-            # Filtrar los valores nulos, NaN y blancos
-            non_null_values = df[column].dropna().apply(lambda x: x.strip() if isinstance(x, str) else x)
-            non_null_values = non_null_values[non_null_values != '']
-
-            # Calculamos la proporción de valores convertidos exitosamente, excluyendo nulos, NaN y blancos.
-            num_valid_dates = converted[non_null_values.index].notna().sum()
-            num_non_null_values = len(non_null_values)
-            proportion_valid = num_valid_dates / num_non_null_values if num_non_null_values > 0 else 0
-
-            # Si la proporción de valores convertidos es mayor o igual al umbral, actualizamos la columna.
+            serie = df[column]
+
+            if pd.api.types.is_datetime64_any_dtype(serie):
+                df[column] = serie.dt.normalize()
+                continue
+            if pd.api.types.is_numeric_dtype(serie) or pd.api.types.is_bool_dtype(serie):
+                unconverted_columns.append(column)
+                continue
+
+            # Valores no nulos ni blancos
+            texto = serie.astype("string").str.strip()
+            validos = texto.notna() & texto.ne("")
+            num_non_null_values = int(validos.sum())
+            if num_non_null_values == 0:
+                unconverted_columns.append(column)
+                continue
+
+            # Decidir con una muestra
+            no_vacios = texto[validos]
+            ejemplo = no_vacios.sample(n=muestra, random_state=0) if num_non_null_values > muestra else no_vacios
+            previo = formatos_columna.get(column) if formatos_columna is not None else None
+            formato, proporcion_muestra = _inferir_formato(ejemplo, formatos, previo)
+            if formato is None or proporcion_muestra < threshold:
+                unconverted_columns.append(column)
+                continue
+
+            # Columna completa con el formato inferido
+            converted = pd.to_datetime(texto.where(validos), format=formato, errors="coerce")
+            proportion_valid = int(converted.notna().sum()) / num_non_null_values
             if proportion_valid >= threshold:
-                # Usamos apply con lambda para normalizar la fecha.
-                df[column] = converted.apply(lambda x: x.normalize() if pd.notna(x) else pd.NaT)
+                df[column] = converted.dt.normalize()
+                if formatos_columna is not None:
+                    formatos_columna[column] = formato
             else:
-                # Si no se convierte, agregamos el nombre de la columna a la lista.
                 unconverted_columns.append(column)
-    
+
         return df, unconverted_columns
-    
+
     except Exception as e:
         print(f"Error convert_to_datetime_with_threshold: {e}")
         # Devuelve el DataFrame original y una lista vacía para evitar errores de desempaquetamiento
         return df, []
-    
 
-    
+
 def clean_dataframe_headers(df, prefix=""):
     # """
     # Limpia los encabezados de un DataFrame de pandas.
@@ -443,53 +1288,49 @@ def add_prefix(df, prefix=""):
     return df
 
 
-def set_headers_from_parquet(df):
+# Columnas que set_headers_from_parquet busca por defecto (reporte de otro cliente); para los
+# reportes de SAP pasar las del registro, p.ej. list(ESQUEMAS_SAP["COBRADO"])
+COLUMNAS_ENCABEZADO = [
+    "IWM_JOB_NUMBER",
+    "PACE",
+    "Project Type",
+    "FTU Status",
+    "CL001 Aging",
+    "CI050 Aging",
+    "Comments"
+    ]
+
+
+def set_headers_from_parquet(df, cta_col=None, num_rows_to_check=5):
     # """
     # Limpia los encabezados de un DataFrame y establece una fila como encabezado si contiene la mayoría de los nombres de columna especificados.
+    # Para archivos nuevos es mejor detectar el encabezado al leer (source_utils.convert_to_parquet).
 
     # Args:
     # - df (pd.DataFrame): DataFrame que necesita limpieza de encabezados.
-    # - cta_col (list): Lista de nombres de columna que deben estar presentes en la fila encabezado.
+    # - cta_col (list, optional): Lista de nombres de columna que deben estar presentes en la fila encabezado.
+    #   Por defecto COLUMNAS_ENCABEZADO.
+    # - num_rows_to_check (int): Filas de datos a revisar.
 
     # Returns:
     # - pd.DataFrame: DataFrame con los encabezados ajustados.
     # """
-    cta_col = [
-        "IWM_JOB_NUMBER",
-        "PACE",
-        "Project Type",
-        "FTU Status",
-        "CL001 Aging",
-        "CI050 Aging",
-        "Comments"
-        ]
+    cta_col = COLUMNAS_ENCABEZADO if cta_col is None else cta_col
 
     # Limpiar espacios de los actuales encabezados
     df.columns = df.columns.str.strip()
 
-    # Definir el número de filas a revisar, por ejemplo, las primeras 5 filas
-    num_rows_to_check = 5
-
-    # Limpiar espacios de las primeras `num_rows_to_check` filas
-    for i in range(num_rows_to_check):
-        df.iloc[i] = df.iloc[i].astype(str).str.strip()
-
-    # Verificar cuál tiene más coincidencias: encabezado actual o filas de datos
-    header_matches = sum(1 for col in cta_col if col in df.columns)
-    
-    best_row_index = None
-    max_row_matches = 0
-
-    for i in range(num_rows_to_check):
-        row_matches = sum(1 for col in cta_col if col in df.iloc[i].values)
-        if row_matches > max_row_matches:
-            max_row_matches = row_matches
-            best_row_index = i
-
-    # Si una de las filas de datos tiene más coincidencias, establecerla como nuevo encabezado
-    if best_row_index is not None and max_row_matches > header_matches:
-        new_header = df.iloc[best_row_index]
-        df = df.drop(best_row_index).reset_index(drop=True)
+    # Encabezado actual contra las primeras filas; solo se revisan esas filas, sin tocar el df.
+    # Gana el encabezado actual si empata.
+    candidatas = [list(df.columns)] + df.head(num_rows_to_check).values.tolist()
+    fila = detectar_encabezado(candidatas, cta_col, minimo=1)
+
+    # Si una de las filas de datos tiene más coincidencias, establecerla como nuevo encabezado;
+    # las filas de título que quedan arriba se descartan
+    if fila > 0:
+        best_row_index = fila - 1
+        new_header = [str(valor).strip() for valor in df.iloc[best_row_index]]
+        df = df.iloc[best_row_index + 1:].reset_index(drop=True)
         df.columns = new_header
         print(f"Encabezado establecido usando la fila de datos index: {best_row_index}")
     else:
@@ -542,27 +1383,90 @@ def eliminar_columnas_duplicadas(df):
 
     return df[columnas_unicas]
 
+def _cargar_coincidencias(ruta, catalogo):
+    # Pares original -> [sugerido, score] guardados para este catálogo; si el catálogo cambió se descartan
+    if not ruta or not os.path.exists(ruta):
+        return {}
+    try:
+        with open(ruta, "r", encoding="utf-8") as f:
+            registro = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return registro.get("pares", {}) if registro.get("catalogo") == catalogo else {}
+
+
+def _guardar_coincidencias(ruta, catalogo, pares):
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    with open(ruta + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"catalogo": catalogo, "pares": pares}, f, ensure_ascii=False)
+    os.replace(ruta + ".tmp", ruta)
+
+
 def corregir_columna(df, col_name, valid_list,
-                     threshold_auto=90, threshold_flag=70):
-    corrections = []
-    flagged_rows = []
-
-    for idx, val in df[col_name].fillna("").items():
-        # Obtener mejor coincidencia
-        match, score, _ = process.extractOne(
-            val, valid_list, scorer=fuzz.WRatio
-        )
-        if score >= threshold_auto:
-            df.at[idx, col_name] = match
-        elif score >= threshold_flag:
-            flagged_rows.append(df.loc[idx].copy())
-        # opcional: guardar todo para auditoría
-        corrections.append((idx, val, match, score))
-
-    flagged_df = pd.DataFrame(flagged_rows)
-    return df, pd.DataFrame(corrections, columns=[
-        'index','original','suggested','score'
-    ]), flagged_df
+                     threshold_auto=90, threshold_flag=70, cache=None, workers=-1, celdas_por_bloque=20_000_000):
+    # """
+    # Corrige una columna contra una lista de valores válidos (p.ej. nombres del catálogo del SAT) con
+    # coincidencia difusa (rapidfuzz, WRatio). Solo se califican los valores únicos, por bloques con
+    # process.cdist en todos los núcleos, y el resultado se reparte a las filas de forma vectorizada.
+
+    # Args:
+    #     df (pd.DataFrame): DataFrame a corregir (se modifica).
+    #     col_name (str): Columna a corregir.
+    #     valid_list (list): Valores válidos.
+    #     threshold_auto (float): Score desde el que se reemplaza el valor.
+    #     threshold_flag (float): Score desde el que la fila se marca para revisión (si no se reemplazó).
+    #     cache (str, optional): Archivo .json donde se guardan los pares original -> sugerido ya
+    #         calculados; en la siguiente corrida solo se califican los nombres nuevos. Se descarta
+    #         solo si cambia valid_list.
+    #     workers (int): Núcleos para cdist (-1 = todos).
+    #     celdas_por_bloque (int): Límite de valores únicos x válidos calificados a la vez (memoria).
+
+    # Returns:
+    #     tuple: (df, auditoría [index, original, suggested, score], filas marcadas para revisión)
+    # """
+    try:
+        from rapidfuzz import process, fuzz
+    except ImportError as e:
+        raise ImportError("corregir_columna necesita rapidfuzz (pip install rapidfuzz).") from e
+
+    validos = list(dict.fromkeys(valid_list))
+    if not validos:
+        raise ValueError("valid_list está vacía.")
+    catalogo = hashlib.sha256(json.dumps(validos, ensure_ascii=False).encode("utf-8")).hexdigest()
+    pares = _cargar_coincidencias(cache, catalogo)
+
+    originales = df[col_name].fillna("").astype(str)
+    codigos, unicos = pd.factorize(originales)
+    pendientes = [v for v in unicos if v not in pares]
+
+    filas_por_bloque = max(1, celdas_por_bloque // len(validos))
+    for inicio in range(0, len(pendientes), filas_por_bloque):
+        bloque = pendientes[inicio:inicio + filas_por_bloque]
+        scores = process.cdist(bloque, validos, scorer=fuzz.WRatio, dtype=np.float64, workers=workers)
+        mejores = scores.argmax(axis=1)
+        for valor, mejor, score in zip(bloque, mejores, scores[np.arange(len(bloque)), mejores]):
+            pares[valor] = [validos[mejor], float(score)]
+
+    if cache and pendientes:
+        _guardar_coincidencias(cache, catalogo, pares)
+
+    sugeridos = np.array([pares[v][0] for v in unicos], dtype=object)[codigos]
+    scores = np.array([pares[v][1] for v in unicos], dtype=float)[codigos]
+
+    automaticas = scores >= threshold_auto
+    revisar = ~automaticas & (scores >= threshold_flag)
+    flagged_df = df.loc[revisar].copy()
+    df.loc[automaticas, col_name] = sugeridos[automaticas]
+
+    audit_df = pd.DataFrame({
+        "index": df.index,
+        "original": originales.to_numpy(dtype=object),
+        "suggested": sugeridos,
+        "score": scores,
+    })
+    print(f" [OK] '{col_name}': {len(unicos)} valores únicos ({len(pendientes)} calificados), "
+          f"{int(automaticas.sum())} filas corregidas, {int(revisar.sum())} para revisión.")
+    return df, audit_df, flagged_df
 
 # def corregir_columna(df, col_name, valid_list,
 #                      threshold_auto=89, threshold_flag=70):
@@ -590,11 +1494,146 @@ def quitar_notacion(valor):
         return format(Decimal(str(valor)).quantize(1), "f")
     except:
         return valor
+
+
+_PATRON_NUMERO = r"^(?P<signo>[+-]?)(?P<entero>\d*)(?:\.(?P<fraccion>\d*))?(?:[eE](?P<exponente>[+-]?\d{1,4}))?$"
+
+
+def normalizar_llave(serie):
+    # """
+    # Versión vectorizada de quitar_notacion: convierte llaves que Excel dejó en notación
+    # científica o con decimales ("1.5000012345E+9", "1500012345.0") a enteros exactos en texto,
+    # redondeando igual que Decimal.quantize(1) (mitad al par). Trabaja sobre la columna completa
+    # con pyarrow.compute y aritmética int64; solo las llaves de más de 18 dígitos pasan por Decimal.
+
+    # Args:
+    #     serie (pd.Series): Columna con las llaves (texto o numérica).
+
+    # Returns:
+    #     tuple: (pd.Series de texto con las llaves normalizadas; los valores que no son números
+    #     se dejan como estaban, pd.Series bool con True en los valores no interpretables)
+    # """
+    texto = pc.utf8_trim_whitespace(pa.array(serie.astype("string"), type=pa.large_string(), from_pandas=True))
+    partes = pc.extract_regex(texto, _PATRON_NUMERO)
+
+    digitos_txt = pc.binary_join_element_wise(partes.field("entero"), partes.field("fraccion"), pa.scalar("", pa.large_string()))
+    valido = pc.fill_null(pc.greater(pc.utf8_length(digitos_txt), 0), False)
+    invalidos = pc.and_(pc.is_valid(texto), pc.invert(valido))
+
+    mantisa = pc.utf8_ltrim(pc.fill_null(digitos_txt, ""), characters="0")
+    exponente = pc.replace_substring(pc.fill_null(partes.field("exponente"), ""), "+", "")
+    exponente = pc.if_else(pc.equal(exponente, ""), "0", exponente)
+    escala = (pc.cast(exponente, pa.int64()).to_numpy(zero_copy_only=False)
+              - pc.fill_null(pc.utf8_length(partes.field("fraccion")), 0).to_numpy(zero_copy_only=False))
+    digitos = pc.utf8_length(mantisa).to_numpy(zero_copy_only=False)
+
+    # Camino rápido en int64: mantisa de hasta 18 dígitos y resultado que cabe en int64
+    valido = valido.to_numpy(zero_copy_only=False)
+    rapido = valido & (digitos <= 18) & (digitos + np.clip(escala, 0, None) <= 18)
+
+    m_txt = pc.if_else(pa.array(rapido & (digitos > 0)), mantisa, "0")
+    m = pc.cast(m_txt, pa.int64()).to_numpy(zero_copy_only=False)
+    e = np.where(rapido, escala, 0)
+
+    potencia = np.power(10, np.minimum(np.abs(e), 18), dtype="int64")
+    cociente, residuo = np.divmod(m, potencia)
+    mitad = potencia // 2
+    redondeo = (residuo > mitad) | ((residuo == mitad) & (cociente % 2 == 1))
+    # Con más de 18 decimales cualquier mantisa de 18 dígitos queda por debajo de 0.5
+    cociente = np.where(np.abs(e) > 18, 0, cociente + redondeo)
+
+    valores = np.where(e >= 0, m * potencia, cociente)
+    negativo = pc.fill_null(pc.equal(partes.field("signo"), "-"), False).to_numpy(zero_copy_only=False)
+    valores = np.where(negativo & (valores != 0), -valores, valores)
+
+    resultado = pc.if_else(pa.array(rapido), pc.cast(pa.array(valores), pa.large_string()), texto)
+    resultado = pd.Series(pd.arrays.ArrowStringArray(resultado), index=serie.index, name=serie.name)
+    invalidos = pd.Series(invalidos.to_numpy(zero_copy_only=False), index=serie.index)
+
+    # Llaves fuera de rango de int64 (muy raras): Decimal solo sobre ese subconjunto
+    lento = np.flatnonzero(valido & ~rapido)
+    if len(lento):
+        resultado = resultado.astype("string")
+        for pos in lento:
+            try:
+                resultado.iat[pos] = format(Decimal(resultado.iat[pos]).quantize(1), "f")
+            except InvalidOperation:
+                invalidos.iat[pos] = True
+
+    if invalidos.any():
+        print(f"  [WARN] {int(invalidos.sum())} valores no se pudieron normalizar como llave numérica.")
+
+    return resultado, invalidos
+
     
-def Guardar_Formato(df, carpeta_base, subcarpeta, nombre_archivo):
+FILAS_EXCEL = 1_048_576
+
+
+def _valores_excel(serie):
+    # Valores de una columna listos para xlsxwriter: nulos (NaN, NaT, pd.NA) como None
+    valores = serie.astype(object)
+    return valores.where(serie.notna(), None).tolist()
+
+
+def _escribir_excel(df, ruta, hoja="Layout_Cia", filas_por_bloque=50_000):
+    # Escribe el layout con xlsxwriter en modo constant_memory; devuelve cuántas hojas se usaron
+    import xlsxwriter
+
+    # Los textos se escriben tal cual: una observación que empiece con "=" o un folio con forma
+    # de URL no se convierten en fórmula / hipervínculo
+    workbook = xlsxwriter.Workbook(ruta, {
+        "constant_memory": True,
+        "strings_to_formulas": False,
+        "strings_to_urls": False,
+        "nan_inf_to_errors": True,
+    })
+    try:
+        fuente = {"font_name": "Montserrat", "font_size": 12}
+        formato_general = workbook.add_format(fuente)
+        formato_4dec = workbook.add_format({**fuente, "num_format": "0.0000"})
+        formato_fecha = workbook.add_format({**fuente, "num_format": "dd/mm/yyyy"})
+
+        columnas = list(df.columns)
+        formatos = [formato_4dec if col == "TC Reporte" else formato_general for col in columnas]
+        fechas = [c for c, col in enumerate(columnas) if pd.api.types.is_datetime64_any_dtype(df[col])]
+
+        filas_por_hoja = FILAS_EXCEL - 1
+        hojas = max(1, -(-len(df) // filas_por_hoja))
+        for n in range(hojas):
+            worksheet = workbook.add_worksheet(hoja if n == 0 else f"{hoja}_{n + 1}")
+            worksheet.freeze_panes(1, 0)
+            for c, formato in enumerate(formatos):
+                worksheet.set_column(c, c, None, formato)
+            worksheet.write_row(0, 0, [str(col) for col in columnas], formato_general)
+
+            fila = 1
+            fin_hoja = min(len(df), (n + 1) * filas_por_hoja)
+            for inicio in range(n * filas_por_hoja, fin_hoja, filas_por_bloque):
+                bloque = df.iloc[inicio:min(inicio + filas_por_bloque, fin_hoja)]
+                valores = [_valores_excel(bloque[col]) for col in bloque.columns]
+                # Las fechas van aparte porque necesitan su formato de celda
+                valores_fecha = [(c, valores[c]) for c in fechas]
+                for c in fechas:
+                    valores[c] = [None] * len(bloque)
+                for k, registro in enumerate(zip(*valores)):
+                    # Las celdas sin formato propio toman el de su columna (set_column)
+                    worksheet.write_row(fila, 0, registro)
+                    for c, columna_fecha in valores_fecha:
+                        if columna_fecha[k] is not None:
+                            worksheet.write_datetime(fila, c, columna_fecha[k], formato_fecha)
+                    fila += 1
+    finally:
+        workbook.close()
+    return hojas
+
+
+def Guardar_Formato(df, carpeta_base, subcarpeta, nombre_archivo, hoja="Layout_Cia", filas_por_bloque=50_000):
 #def guardar_dataframe(df, carpeta_base, subcarpeta, nombre_archivo, formato='parquet'):
     """
-    Aplica formato numérico de 4 decimales fijos a la columna 'TC Reporte'.
+    Exporta el layout a xlsx con xlsxwriter en modo constant_memory: las filas se escriben por bloques
+    y se van bajando a disco, con los formatos por columna creados una sola vez (Montserrat 12,
+    'TC Reporte' con 4 decimales fijos, fechas dd/mm/aaaa). Si el DataFrame no cabe en una hoja
+    (1,048,576 filas con el encabezado) continúa en Layout_Cia_2, Layout_Cia_3, ...
     Se requiere "pip install XlsxWriter"
     """
     # Ruta destino
@@ -602,27 +1641,10 @@ def Guardar_Formato(df, carpeta_base, subcarpeta, nombre_archivo):
         ruta_carpeta = os.path.join(carpeta_base, subcarpeta)
         os.makedirs(ruta_carpeta, exist_ok=True)
         ruta_completa = os.path.join(ruta_carpeta, f"{nombre_archivo}.xlsx")
-        # Crear escritor con xlsxwriter
-        with pd.ExcelWriter(ruta_completa, engine="xlsxwriter") as writer:
-            df.to_excel(writer, index=False, sheet_name="Layout_Cia")
+        hojas = escribir_archivo(df, ruta_completa, "xlsx", hoja=hoja, filas_por_bloque=filas_por_bloque)
 
-            workbook  = writer.book
-            worksheet = writer.sheets["Layout_Cia"]
-            worksheet.freeze_panes(1, 0)
-
-            # Crear formato con 4 decimales fijos
-            formato_4dec = workbook.add_format({"num_format": "0.0000"})
-
-            formato_general = workbook.add_format({
-                "font_name": "Montserrat",
-                "font_size": 12,
-            })
-            if "TC Reporte" in df.columns:
-                col_idx = df.columns.get_loc("TC Reporte")
-                worksheet.set_column(col_idx, col_idx, None, formato_4dec)
-            worksheet.set_column("A:Z", None, formato_general)
-            for col_num, col_name in enumerate(df.columns): worksheet.write(0, col_num, col_name, formato_general)
-    
+        if hojas > 1:
+            print(f"  [WARN] {len(df)} filas exceden el límite de Excel; se repartieron en {hojas} hojas.")
         logging.info(f"Archivo guardado en: {ruta_completa}")
         print(f" [OK] Archivo guardado exitosamente en: {ruta_completa}")
     except Exception as e:
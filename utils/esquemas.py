@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from decimal import Decimal
+
+
+# Tipos lógicos del registro
+TEXTO = "texto"              # cadena exacta (llaves, folios, descripciones)
+IMPORTE = "importe"          # decimal(18, 2)
+TIPO_CAMBIO = "tipo_cambio"  # decimal(18, 6)
+FECHA = "fecha"              # datetime64 normalizado al día
+
+ESCALAS_DECIMALES = {
+    IMPORTE: 2,
+    TIPO_CAMBIO: 6,
+}
+
+# Columnas comunes de las partidas de SAP (FBL1N, FBL5N, FBL3N)
+_PARTIDAS_SAP = {
+    "Account": TEXTO,
+    "Assignment": TEXTO,
+    "Document Number": TEXTO,
+    "Document Type": TEXTO,
+    "Clearing Document": TEXTO,
+    "Tax Code": TEXTO,
+    "Text": TEXTO,
+    "Description Offsetting Item": TEXTO,
+    "Debit/Credit Ind.": TEXTO,
+    "Offsetting Acct Type": TEXTO,
+    "Document Currency": TEXTO,
+    "Document Date": FECHA,
+    "Posting Date": FECHA,
+    "Clearing Date": FECHA,
+    "Amount in Local Currency": IMPORTE,
+    "Amount in Doc. Curr.": IMPORTE,
+    "Withholding Tax Amt": IMPORTE,
+    "Eff. Exchange Rate": TIPO_CAMBIO,
+}
+
+# Atributos del comprobante CFDI
+_CFDI = {
+    "UUID": TEXTO,
+    "Serie": TEXTO,
+    "Folio": TEXTO,
+    "Fecha": FECHA,
+    "Moneda": TEXTO,
+    "SubTotal": IMPORTE,
+    "Total": IMPORTE,
+    "TipoCambio": TIPO_CAMBIO,
+}
+
+# Registro por reporte; la llave es la cadena que aparece en el nombre del archivo
+ESQUEMAS_SAP = {
+    "PROVEEDORES": _PARTIDAS_SAP,
+    "CLIENTES": _PARTIDAS_SAP,
+    "ACREDITABLE": _PARTIDAS_SAP,
+    "COBRADO": _PARTIDAS_SAP,
+    "BANCOS": _PARTIDAS_SAP,
+    "EMITIDOS": _CFDI,
+    "RECIBIDOS": _CFDI,
+}
+
+
+def detectar_reporte(nombre_archivo):
+    # """
+    # Identifica el reporte de SAP/CFDI a partir del nombre del archivo.
+
+    # Args:
+    #     nombre_archivo (str): Nombre del archivo (con o sin extensión).
+
+    # Returns:
+    #     str: Llave de ESQUEMAS_SAP o None si no corresponde a ningún reporte.
+    # """
+    nombre = str(nombre_archivo).upper()
+    for reporte in ESQUEMAS_SAP:
+        if reporte in nombre:
+            return reporte
+    return None
+
+
+def detectar_encabezado(filas, columnas_esperadas, minimo=2):
+    # """
+    # Encuentra la fila de encabezado en las primeras filas de un reporte (los de SAP traen filas de
+    # título antes del encabezado real): la que contiene más nombres de columnas_esperadas.
+
+    # Args:
+    #     filas (list): Primeras filas del archivo, cada una como lista de celdas.
+    #     columnas_esperadas (iterable): Nombres de columna esperados (p.ej. las llaves de ESQUEMAS_SAP[reporte]).
+    #     minimo (int): Coincidencias mínimas para aceptar una fila; si ninguna llega se usa la primera.
+
+    # Returns:
+    #     int: Índice (desde 0) de la fila de encabezado.
+    # """
+    esperadas = {str(col).strip() for col in columnas_esperadas}
+    mejor, max_coincidencias = 0, 0
+    for i, fila in enumerate(filas):
+        coincidencias = len(esperadas.intersection(str(valor).strip() for valor in fila if valor is not None))
+        if coincidencias > max_coincidencias:
+            mejor, max_coincidencias = i, coincidencias
+    return mejor if max_coincidencias >= minimo else 0
+
+
+def dtypes_lectura(esquema):
+    # """
+    # Arma el dict dtype= para read_excel/read_csv: las columnas de texto del registro se leen como str
+    # para que las llaves no pasen por float. Importes y fechas se leen con su tipo nativo y se
+    # convierten después en aplicar_esquema.
+    # """
+    if not esquema:
+        return None
+    return {col: str for col, tipo in esquema.items() if tipo == TEXTO}
+
+
+# Importe con miles separados por coma y punto decimal, signo al inicio o al final (SAP: "1,234.56-")
+_NUMERO = r"(?:(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d*)?|\.\d+)"
+_PATRON_IMPORTE = rf"[+-]?{_NUMERO}|{_NUMERO}-"
+# Texto que parece importe pero con otra convención de separadores ("1.234,56", "1,23")
+_PATRON_AMBIGUO = r"[+-]?[\d.,]*\d[\d.,]*-?"
+
+
+def _texto_importe(valor):
+    # Los float pasan por Decimal(str(x)) para conservar sus dígitos sin notación científica
+    if valor is None or (isinstance(valor, float) and pd.isna(valor)) or valor is pd.NA:
+        return None
+    if isinstance(valor, float):
+        return format(Decimal(str(valor)), "f")
+    return str(valor)
+
+
+def _a_decimal(serie, escala):
+    # """
+    # Convierte importes a decimal exacto de Arrow sin pasar por float: el texto se parsea directo
+    # a decimal y los float (xlsb/openpyxl) se convierten con Decimal(str(x)). Redondea a la escala
+    # alejándose del cero (1.005 -> 1.01).
+
+    # Raises:
+    #     ValueError: Si hay importes con separadores ambiguos (p.ej. "1.234,56") en lugar de adivinar.
+    # """
+    if pd.api.types.is_float_dtype(serie) or serie.dtype == object:
+        texto = pd.Series([_texto_importe(x) for x in serie], index=serie.index, dtype="string").str.strip()
+    else:
+        texto = serie.astype("string").str.strip()
+
+    validos = texto.str.fullmatch(_PATRON_IMPORTE).fillna(False).astype(bool)
+    ambiguos = ~validos & texto.str.fullmatch(_PATRON_AMBIGUO).fillna(False).astype(bool)
+    if ambiguos.any():
+        ejemplos = texto[ambiguos].unique()[:5].tolist()
+        raise ValueError(f"Importes con separadores ambiguos en '{serie.name}': {ejemplos}")
+
+    # Texto no numérico ("N/A", vacío) queda nulo, igual que antes
+    texto = texto.where(validos).str.replace(",", "", regex=False)
+    negativos = texto.str.endswith("-").fillna(False).astype(bool)
+    texto = texto.str.rstrip("-").mask(negativos, "-" + texto.str.rstrip("-"))
+
+    arreglo = pc.cast(pa.array(texto, type=pa.large_string(), from_pandas=True), pa.decimal128(38, 18))
+    arreglo = pc.round(arreglo, ndigits=escala, round_mode="half_towards_infinity").cast(pa.decimal128(18, escala))
+    return pd.Series(arreglo.to_pandas(types_mapper=pd.ArrowDtype), index=serie.index, name=serie.name)
+
+
+def _a_fecha(serie):
+    # Fechas de SAP: datetime de openpyxl, serial de Excel (xlsb) o texto dd.mm.aaaa
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.dt.normalize()
+    if pd.api.types.is_numeric_dtype(serie):
+        return pd.to_datetime(serie, unit="D", origin="1899-12-30", errors="coerce").dt.normalize()
+
+    numeros = pd.to_numeric(serie, errors="coerce")
+    texto = serie.astype("string").str.strip()
+    fechas = pd.to_datetime(texto, format="%d.%m.%Y", errors="coerce")
+
+    faltantes = fechas.isna() & texto.notna()
+    seriales = faltantes & numeros.notna()
+    if seriales.any():
+        fechas[seriales] = pd.to_datetime(numeros[seriales], unit="D", origin="1899-12-30", errors="coerce")
+    faltantes &= ~seriales
+    if faltantes.any():
+        fechas[faltantes] = pd.to_datetime(texto[faltantes], format="ISO8601", errors="coerce")
+    faltantes &= fechas.isna()
+    if faltantes.any():
+        fechas[faltantes] = pd.to_datetime(texto[faltantes], dayfirst=True, errors="coerce")
+    return fechas.dt.normalize()
+
+
+def aplicar_esquema(df, esquema=None):
+    # """
+    # Aplica los tipos del registro a un DataFrame recién leído. Las columnas fuera del registro
+    # conservan su tipo numérico/fecha y las de texto mixto pasan a dtype "string" (con nulos reales).
+
+    # Args:
+    #     df (pd.DataFrame): DataFrame leído con dtype=dtypes_lectura(esquema).
+    #     esquema (dict): {columna: tipo lógico}. None = solo normaliza columnas object.
+
+    # Returns:
+    #     pd.DataFrame: DataFrame tipado.
+    # """
+    esquema = esquema or {}
+    df.columns = [str(col) for col in df.columns]
+
+    for col in df.columns:
+        tipo = esquema.get(col)
+        if tipo == TEXTO:
+            df[col] = df[col].astype("string").str.strip()
+        elif tipo in ESCALAS_DECIMALES:
+            df[col] = _a_decimal(df[col], ESCALAS_DECIMALES[tipo])
+        elif tipo == FECHA:
+            df[col] = _a_fecha(df[col])
+        elif df[col].dtype == object:
+            df[col] = df[col].astype("string")
+
+    return df
@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 
 import os
+import time
 import pandas as pd
 import shutil
+from utils.source_utils import ejecutar_tareas, reportar_resultados, fila_encabezado
+from utils.esquemas import ESQUEMAS_SAP, detectar_reporte, dtypes_lectura, aplicar_esquema
 
 
 def xlsb_convert_to_parquet(ruta_origen, ruta_destino):
@@ -18,12 +21,13 @@ def xlsb_convert_to_parquet(ruta_origen, ruta_destino):
 
             try:
                 print(f"Leyendo: {archivo}")
+                esquema = ESQUEMAS_SAP.get(detectar_reporte(archivo))
                 if archivo.endswith(('.xlsx', '.xls', '.xlsm', '.xlsb','.XLSX', '.XLS', '.XLSM', '.XLSB')):
-                    df = pd.read_excel(ruta_archivo)
+                    df = pd.read_excel(ruta_archivo, dtype=dtypes_lectura(esquema))
                 elif archivo.endswith(".csv"):
-                    df = pd.read_csv(ruta_archivo, encoding='utf-8', on_bad_lines='skip')
+                    df = pd.read_csv(ruta_archivo, encoding='utf-8', on_bad_lines='skip', dtype=dtypes_lectura(esquema))
 
-                df = df.astype(str)
+                df = aplicar_esquema(df, esquema)
                 
                 df.to_parquet(ruta_salida, engine="pyarrow", index=False)
                 print(f"Guardado: {nombre_salida}")
@@ -31,7 +35,32 @@ def xlsb_convert_to_parquet(ruta_origen, ruta_destino):
                 print(f"Error en {archivo}: {e}")
 
 
-def xlsb_convert_to_csv(input_folder, sheet_name=None, backup_folder_name="old_bk"):
+def _xlsb_a_csv(file_path, backup_folder_path, sheet_name, columnas_esperadas=None):
+    # Convierte un solo Excel a CSV y lo mueve a respaldo; se ejecuta dentro de un proceso del pool
+    filename = os.path.basename(file_path)
+    inicio = time.time()
+
+    try:
+        # Leer el archivo Excel, usar la primera hoja si no se proporciona sheet_name
+        hoja = 0 if sheet_name is None else sheet_name
+        # Encabezado real del reporte (los de SAP traen filas de título): se leen solo las primeras filas
+        encabezado = fila_encabezado(file_path, columnas_esperadas, sheet_name=hoja) if columnas_esperadas else 0
+        df = pd.read_excel(file_path, sheet_name=hoja, header=encabezado)
+
+        # Convertir a CSV
+        csv_filename = filename.rsplit('.', 1)[0] + '.csv'
+        csv_path = os.path.join(os.path.dirname(file_path), csv_filename)
+        df.to_csv(csv_path, index=False)
+
+        # Mover el archivo Excel a la carpeta de respaldo
+        shutil.move(file_path, backup_folder_path)
+        return {"archivo": filename, "estado": "OK", "mensaje": f"Convertido a {csv_filename}", "segundos": time.time() - inicio}
+
+    except Exception as e:
+        return {"archivo": filename, "estado": "ERROR", "mensaje": f"{type(e).__name__}: {e}", "segundos": time.time() - inicio}
+
+
+def xlsb_convert_to_csv(input_folder, sheet_name=None, backup_folder_name="old_bk", workers=None, encabezados=None):
     # """
     # Convierte una hoja especfica de todos los archivos Excel en una carpeta a CSV
     # y mueve los originales a una carpeta de respaldo. Usa la primera hoja si no se proporciona nombre de hoja.
@@ -40,9 +69,12 @@ def xlsb_convert_to_csv(input_folder, sheet_name=None, backup_folder_name="old_b
     # - input_folder (str): Ruta de la carpeta que contiene los archivos Excel.
     # - sheet_name (str, optional): Nombre de la hoja que se desea convertir. Si no se proporciona, se usa la primera hoja.
     # - backup_folder_name (str): Nombre de la carpeta de respaldo para mover los archivos originales.
+    # - workers (int, optional): Procesos para convertir archivos en paralelo. None = en serie.
+    # - encabezados (dict|bool, optional): Columnas esperadas por reporte para detectar el encabezado
+    #   real; por defecto las de utils.esquemas. False = el encabezado siempre es la primera fila.
 
     # Returns:
-    # - None
+    # - list: Resultados por archivo.
     # """
     # Crear carpeta de respaldo si no existe
     backup_folder_path = os.path.join(input_folder, backup_folder_name)
@@ -53,32 +85,18 @@ def xlsb_convert_to_csv(input_folder, sheet_name=None, backup_folder_name="old_b
     excel_extensions = ('.xlsx', '.xls', '.xlsm', '.xlsb','.XLSX', '.XLS', '.XLSM', '.XLSB')
 
     # Iterar sobre todos los archivos en la carpeta de <SIGNUM>
+    tareas = []
     for filename in os.listdir(input_folder):
         # Verificar si el archivo tiene una de las extensiones de Excel
         if filename.lower().endswith(excel_extensions):
-            file_path = os.path.join(input_folder, filename)
-
-            try:
-                # Leer el archivo Excel, usar la primera hoja si no se proporciona sheet_name
-                if sheet_name is None:
-                    df = pd.read_excel(file_path, sheet_name=0)
-                else:
-                    df = pd.read_excel(file_path, sheet_name=sheet_name)
-
-                # Convertir a CSV
-                csv_filename = filename.rsplit('.', 1)[0] + '.csv'
-                csv_path = os.path.join(input_folder, csv_filename)
-                df.to_csv(csv_path, index=False)
-                print(f" [OK] Convertido {filename} a {csv_filename}")
-
-                # Mover el archivo Excel a la carpeta de respaldo
-                shutil.move(file_path, backup_folder_path)
-                # print(f" [OK] Movido {filename} a la carpeta {backup_folder_name}")
-
-            except Exception as e:
-                print(f" [ERROR] al procesar {filename}: {e}")
-
-    print("Proceso completado.")
+            columnas_esperadas = None
+            if encabezados is not False:
+                reporte = detectar_reporte(filename)
+                columnas_esperadas = (encabezados or {}).get(reporte) or list(ESQUEMAS_SAP.get(reporte) or []) or None
+            tareas.append((os.path.join(input_folder, filename), backup_folder_path, sheet_name, columnas_esperadas))
+
+    resultados = ejecutar_tareas(_xlsb_a_csv, tareas, workers=workers)
+    return reportar_resultados(resultados, "Proceso completado.")
 
 
 def xlsb_convert_single_to_csv(input_folder, search_string, sheet_name, backup_folder_name="old_bk"):
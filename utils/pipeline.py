@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import hashlib
+import inspect
+import threading
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from utils.catalogo import obtener_catalogo
+
+
+def huella_utils():
+    # """
+    # Hash del código de los módulos de utils. Entra en la llave de cada paso para que un cambio en
+    # las funciones que llaman los pasos (normalizar_llave, unir_dataframes...) invalide la cache,
+    # aunque el código del paso sea el mismo.
+    # """
+    carpeta = os.path.dirname(os.path.abspath(__file__))
+    h = hashlib.sha256()
+    for nombre in sorted(os.listdir(carpeta)):
+        if nombre.endswith(".py"):
+            h.update(nombre.encode("utf-8"))
+            with open(os.path.join(carpeta, nombre), "rb") as f:
+                h.update(f.read())
+    return h.hexdigest()
+
+
+class Paso:
+    # """
+    # Nodo del pipeline.
+
+    # Args:
+    #     nombre (str): Nombre único del paso.
+    #     funcion (callable): Recibe las salidas de sus dependencias (en orden) y los params como kwargs.
+    #     dependencias (list): Nombres de los pasos de los que depende.
+    #     params (dict): Definición del paso (listas de columnas, mapas de renombre, rutas...).
+    #     huella (callable, optional): Devuelve datos serializables que identifican entradas externas
+    #         (p.ej. tamaño y mtime del parquet que se lee). Se evalúa justo antes de ejecutar el paso.
+    #     cache (bool): Si False el paso se ejecuta siempre.
+    # """
+
+    def __init__(self, nombre, funcion, dependencias=(), params=None, huella=None, cache=True):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.dependencias = list(dependencias)
+        self.params = params or {}
+        self.huella = huella
+        self.cache = cache
+
+    def definicion(self):
+        # Lo que identifica al paso: función (nombre y código) y parámetros
+        try:
+            codigo = inspect.getsource(self.funcion)
+        except (OSError, TypeError):
+            codigo = ""
+        return {
+            "funcion": f"{getattr(self.funcion, '__module__', '')}.{getattr(self.funcion, '__qualname__', repr(self.funcion))}",
+            "codigo": hashlib.sha256(codigo.encode("utf-8")).hexdigest(),
+            "params": self.params,
+        }
+
+
+class Pipeline:
+    # """
+    # Pipeline declarativo: cada tabla se define como una cadena de pasos (leer, conservar, renombrar,
+    # normalizar, unir, exportar) que forman un DAG. Las ramas independientes se ejecutan en paralelo
+    # y la salida de cada paso se guarda en carpeta_cache con una llave calculada a partir de la
+    # definición del paso y las llaves de sus dependencias; si la llave no cambió, el paso no se vuelve
+    # a ejecutar y su salida solo se carga si algún paso posterior la necesita.
+
+    # Args:
+    #     carpeta_cache (str): Carpeta donde se guardan las salidas memorizadas.
+    #     workers (int): Pasos que pueden ejecutarse al mismo tiempo.
+    # """
+
+    def __init__(self, carpeta_cache, workers=4):
+        self.carpeta_cache = carpeta_cache
+        self.workers = workers
+        self.pasos = {}
+        self.version_utils = huella_utils()
+
+    def paso(self, nombre, funcion, dependencias=(), huella=None, cache=True, **params):
+        # """
+        # Declara un paso. Devuelve el nombre para encadenarlo como dependencia de otro paso.
+        # """
+        if nombre in self.pasos:
+            raise ValueError(f"El paso '{nombre}' ya está declarado.")
+        faltantes = [d for d in dependencias if d not in self.pasos]
+        if faltantes:
+            raise ValueError(f"El paso '{nombre}' depende de pasos no declarados: {faltantes}")
+        self.pasos[nombre] = Paso(nombre, funcion, dependencias, params, huella, cache)
+        return nombre
+
+    # ---------------------------------------------------------------- cache
+
+    def _rutas_cache(self, nombre):
+        base = os.path.join(self.carpeta_cache, nombre)
+        return base + ".json", base + ".parquet"
+
+    def _llave(self, paso, llaves_dependencias):
+        contenido = {
+            "paso": paso.definicion(),
+            "utils": self.version_utils,
+            "dependencias": [llaves_dependencias[d] for d in paso.dependencias],
+            "huella": paso.huella() if paso.huella else None,
+        }
+        texto = json.dumps(contenido, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+    def _en_cache(self, paso, llave):
+        if not paso.cache:
+            return False
+        ruta_json, ruta_parquet = self._rutas_cache(paso.nombre)
+        try:
+            with open(ruta_json, "r", encoding="utf-8") as f:
+                registro = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if registro.get("llave") != llave:
+            return False
+        # Los pasos de exportación guardan las rutas que escribieron; si se borraron se rehacen
+        if not all(os.path.exists(ruta) for ruta in registro.get("archivos", [])):
+            return False
+        return not registro.get("dataframe") or os.path.exists(ruta_parquet)
+
+    def _guardar_cache(self, paso, llave, salida):
+        if not paso.cache:
+            return
+        os.makedirs(self.carpeta_cache, exist_ok=True)
+        ruta_json, ruta_parquet = self._rutas_cache(paso.nombre)
+        es_df = isinstance(salida, pd.DataFrame)
+        if es_df:
+            temporal = ruta_parquet + ".tmp"
+            salida.to_parquet(temporal, engine="pyarrow", index=False)
+            os.replace(temporal, ruta_parquet)
+        archivos = [salida] if isinstance(salida, str) else []
+        if isinstance(salida, (list, tuple)) and all(isinstance(x, str) for x in salida):
+            archivos = list(salida)
+        with open(ruta_json + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"llave": llave, "dataframe": es_df, "archivos": archivos}, f, ensure_ascii=False)
+        os.replace(ruta_json + ".tmp", ruta_json)
+
+    def _cargar_cache(self, nombre):
+        ruta_json, ruta_parquet = self._rutas_cache(nombre)
+        with open(ruta_json, "r", encoding="utf-8") as f:
+            registro = json.load(f)
+        return pd.read_parquet(ruta_parquet) if registro.get("dataframe") else None
+
+    # ------------------------------------------------------------ ejecución
+
+    def _necesarios(self, objetivos):
+        necesarios = set()
+        pendientes = list(objetivos)
+        while pendientes:
+            nombre = pendientes.pop()
+            if nombre not in necesarios:
+                necesarios.add(nombre)
+                pendientes.extend(self.pasos[nombre].dependencias)
+        return necesarios
+
+    def ejecutar(self, objetivos=None):
+        # """
+        # Ejecuta el pipeline (o solo lo necesario para los objetivos indicados).
+
+        # Args:
+        #     objetivos (list, optional): Pasos a obtener. None = todos.
+
+        # Returns:
+        #     dict: {paso: "ejecutado" | "cache"}
+        # """
+        necesarios = self._necesarios(objetivos or list(self.pasos))
+        llaves = {}
+        estados = {}
+        salidas = {}
+        candado = threading.Lock()
+
+        def salida_de(nombre):
+            # Las salidas en cache se cargan solo cuando un paso posterior las necesita
+            with candado:
+                if nombre not in salidas:
+                    salidas[nombre] = self._cargar_cache(nombre)
+                return salidas[nombre]
+
+        def correr(paso, llave):
+            inicio = time.time()
+            entradas = [salida_de(d) for d in paso.dependencias]
+            salida = paso.funcion(*entradas, **paso.params)
+            if salida is None and paso.cache:
+                # Las funciones de utils devuelven None cuando fallan (archivo no encontrado, unión inválida)
+                raise RuntimeError(f"El paso '{paso.nombre}' no devolvió datos; no se guarda en cache.")
+            self._guardar_cache(paso, llave, salida)
+            return salida, time.time() - inicio
+
+        en_curso = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while len(estados) < len(necesarios):
+                listos = [
+                    n for n in necesarios
+                    if n not in estados and n not in en_curso.values()
+                    and all(d in estados for d in self.pasos[n].dependencias)
+                ]
+                for nombre in sorted(listos):
+                    paso = self.pasos[nombre]
+                    llave = llaves[nombre] = self._llave(paso, llaves)
+                    if self._en_cache(paso, llave):
+                        estados[nombre] = "cache"
+                        print(f"  [OK] {nombre}: sin cambios, se usa cache")
+                        continue
+                    en_curso[pool.submit(correr, paso, llave)] = nombre
+
+                if len(estados) == len(necesarios):
+                    break
+                if not en_curso:
+                    # Hubo pasos resueltos desde cache; volver a buscar listos
+                    continue
+
+                terminados, _ = wait(list(en_curso), return_when=FIRST_COMPLETED)
+                for futuro in terminados:
+                    nombre = en_curso.pop(futuro)
+                    try:
+                        salida, segundos = futuro.result()
+                        with candado:
+                            salidas[nombre] = salida
+                    except Exception as e:
+                        print(f"  [ERROR] {nombre}: {type(e).__name__}: {e}")
+                        for pendiente in en_curso:
+                            pendiente.cancel()
+                        raise
+                    estados[nombre] = "ejecutado"
+                    print(f"  [OK] {nombre}: ejecutado ({segundos:.1f} s)")
+
+        return estados
+
+
+def huella_parquet(folder, nombre_archivo, exact_match=False):
+    # """
+    # Huella para pasos que leen un parquet: ruta, tamaño y mtime del archivo que resolvería leer_parquet.
+    # """
+    def huella():
+        entrada = obtener_catalogo(folder, refrescar=True).resolver(nombre_archivo, exact_match=exact_match)
+        if entrada is None:
+            return None
+        return [entrada["ruta"], entrada["bytes"], entrada["mtime"]]
+    return huella
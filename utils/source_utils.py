@@ -1,56 +1,352 @@
 ﻿# -*- coding: utf-8 -*-
 
 import os
+import re
+import csv
+import json
 import time
+import codecs
 import shutil
+import hashlib
+import inspect
+import tempfile
+import itertools
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 from glob import glob
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from pyxlsb import open_workbook
 from zipfile import ZipFile, BadZipFile
+import utils.esquemas as esquemas
+from utils.esquemas import ESQUEMAS_SAP, detectar_reporte, detectar_encabezado, dtypes_lectura, aplicar_esquema
+from utils.df_utils import normalizar_nulos, FILAS_POR_GRUPO
 
 
-def convert_to_parquet(ruta_origen, ruta_destino):
+ENGINES_EXCEL = {
+    '.xlsx': 'openpyxl',
+    '.xlsm': 'openpyxl',
+    '.xls' : 'xlrd',
+    '.xlsb': 'pyxlsb',
+}
+
+
+FILAS_ENCABEZADO = 20
+
+
+def fila_encabezado(ruta_archivo, columnas_esperadas, sheet_name=0, filas=FILAS_ENCABEZADO, encoding=None):
+#     # """
+#     # Lee solo las primeras filas del archivo y devuelve el índice de la fila de encabezado
+#     # (ver utils.esquemas.detectar_encabezado). 0 si no se reconoce ninguna.
+
+#     # Args:
+#     # - ruta_archivo (str): Ruta del Excel o CSV.
+#     # - columnas_esperadas (iterable): Nombres de columna esperados del reporte.
+#     # - sheet_name (str|int): Hoja en archivos Excel.
+#     # - filas (int): Filas a revisar.
+#     # - encoding (str, optional): Encoding del CSV (por defecto se detecta).
+
+#     # Returns:
+#     # - int
+#     # """
+    ext = os.path.splitext(ruta_archivo)[1].lower()
+    if ext in ENGINES_EXCEL:
+        inicio = pd.read_excel(ruta_archivo, sheet_name=sheet_name, engine=ENGINES_EXCEL[ext],
+                               header=None, nrows=filas, dtype=object)
+        primeras = inicio.values.tolist()
+    elif ext == '.csv':
+        # csv.reader tolera filas de título con menos campos que el encabezado
+        with open(ruta_archivo, 'r', encoding=encoding or detectar_encoding(ruta_archivo), errors='replace', newline='') as f:
+            primeras = list(itertools.islice(csv.reader(f), filas))
+    else:
+        return 0
+    return detectar_encabezado(primeras, columnas_esperadas)
+
+
+def leer_archivo_fuente(ruta_archivo, sheet_name=0, esquema=None, columnas_esperadas=None):
+#     # """
+#     # Lee un papel de trabajo (Excel en cualquiera de sus formatos o CSV) en una sola pasada.
+#     # Si se indican columnas_esperadas, antes revisa las primeras filas para encontrar el encabezado
+#     # real y lee directo desde ahí (header= en Excel, skiprows= en CSV).
+
+#     # Args:
+#     # - ruta_archivo (str): Ruta del archivo a leer.
+#     # - sheet_name (str|int): Hoja a leer en archivos Excel. Por defecto la primera.
+#     # - esquema (dict, optional): Tipos del registro (utils.esquemas); sus columnas se leen como texto.
+#     # - columnas_esperadas (iterable, optional): Columnas del reporte para detectar el encabezado.
+
+#     # Returns:
+#     # - pd.DataFrame o None si la extensión no es soportada.
+#     # """
+    ext = os.path.splitext(ruta_archivo)[1].lower()
+    dtype = dtypes_lectura(esquema)
+
+    if ext in ENGINES_EXCEL:
+        encabezado = fila_encabezado(ruta_archivo, columnas_esperadas, sheet_name=sheet_name) if columnas_esperadas else 0
+        return pd.read_excel(ruta_archivo, sheet_name=sheet_name, engine=ENGINES_EXCEL[ext], dtype=dtype, header=encabezado)
+    elif ext == '.csv':
+        encoding = detectar_encoding(ruta_archivo)
+        encabezado = fila_encabezado(ruta_archivo, columnas_esperadas, encoding=encoding) if columnas_esperadas else 0
+        try:
+            return pd.read_csv(ruta_archivo, encoding=encoding, on_bad_lines='skip', dtype=dtype, skiprows=encabezado)
+        except UnicodeDecodeError:
+            # La muestra no fue representativa; latin1 lee cualquier byte
+            return pd.read_csv(ruta_archivo, encoding='latin1', on_bad_lines='skip', dtype=dtype, skiprows=encabezado)
+    return None
+
+
+def ejecutar_tareas(funcion, tareas, workers=None):
 #     # """
-#     # Convierte a parquet los archivos de excel en su diferente formato 
+#     # Ejecuta una función por archivo, en serie o en un pool de procesos.
+
+#     # Args:
+#     # - funcion (callable): Función de nivel módulo que recibe los argumentos de cada tarea
+#     #   y devuelve un dict de resultado ({"archivo", "estado", "mensaje", "segundos"}).
+#     # - tareas (list): Lista de tuplas de argumentos; el primero debe ser la ruta del archivo.
+#     # - workers (int, optional): Número de procesos. None o 1 = en serie, -1 = todos los núcleos.
+
+#     # Returns:
+#     # - list: Resultados por archivo.
+#     # """
+    if workers == -1:
+        workers = os.cpu_count()
+
+    if not workers or workers <= 1 or len(tareas) <= 1:
+        return [funcion(*args) for args in tareas]
+
+    # Los archivos más grandes primero para que el tiempo total se acerque al del mayor
+    tareas = sorted(tareas, key=lambda args: os.path.getsize(args[0]), reverse=True)
+
+    resultados = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futuros = {pool.submit(funcion, *args): args for args in tareas}
+        for futuro in as_completed(futuros):
+            try:
+                resultados.append(futuro.result())
+            except Exception as e:
+                resultados.append({
+                    "archivo": os.path.basename(str(futuros[futuro][0])),
+                    "estado": "ERROR",
+                    "mensaje": f"{type(e).__name__}: {e}",
+                    "segundos": None,
+                })
+    return resultados
+
+
+def reportar_resultados(resultados, titulo="Proceso completado."):
+#     # """
+#     # Imprime el resumen de una ejecución por archivo al terminar, ordenado por nombre.
+
+#     # Args:
+#     # - resultados (list): Resultados devueltos por ejecutar_tareas.
+#     # - titulo (str): Texto final del resumen.
+
+#     # Returns:
+#     # - list: Los mismos resultados.
+#     # """
+    for r in sorted(resultados, key=lambda r: r["archivo"]):
+        tiempo = f" ({r['segundos']:.1f} s)" if r.get("segundos") is not None else ""
+        print(f"  [{r['estado']}] {r['archivo']}: {r['mensaje']}{tiempo}")
+
+    conteo = {estado: sum(1 for r in resultados if r["estado"] == estado) for estado in ("OK", "OMITIDO", "WARN", "ERROR")}
+    omitidos = f", OMITIDO: {conteo['OMITIDO']}" if conteo["OMITIDO"] else ""
+    print(f"{titulo} OK: {conteo['OK']}{omitidos}, WARN: {conteo['WARN']}, ERROR: {conteo['ERROR']}")
+    return resultados
+
+
+MANIFEST = "_manifest.json"
+
+
+def hash_archivo(ruta_archivo, bloque=1024 * 1024):
+#     # """
+#     # Calcula el sha256 del contenido de un archivo leyéndolo por bloques.
+
+#     # Args:
+#     # - ruta_archivo (str): Ruta del archivo.
+#     # - bloque (int): Tamaño de lectura en bytes.
+
+#     # Returns:
+#     # - str: Hash hexadecimal.
+#     # """
+    h = hashlib.sha256()
+    with open(ruta_archivo, 'rb') as f:
+        for parte in iter(lambda: f.read(bloque), b''):
+            h.update(parte)
+    return h.hexdigest()
+
+
+def huella_lector():
+#     # """
+#     # Huella de la lógica de lectura: el registro ESQUEMAS_SAP, el código de utils.esquemas y el de las
+#     # funciones que leen y tipan cada fuente. Se guarda en cada entrada del manifest; si cambia, las
+#     # fuentes se reconvierten aunque no hayan cambiado.
+#     # """
+    partes = [json.dumps(ESQUEMAS_SAP, sort_keys=True, ensure_ascii=False, default=str), inspect.getsource(esquemas)]
+    partes += [inspect.getsource(f) for f in (leer_archivo_fuente, fila_encabezado, _convertir_a_parquet, normalizar_nulos)]
+    return hashlib.sha256("\n".join(partes).encode("utf-8")).hexdigest()
+
+
+def cargar_manifest(ruta_destino):
+#     # """
+#     # Lee el manifest de la carpeta de parquets ({archivo_origen: {size, mtime, sha256, parquet, esquema}}).
+#     # Devuelve un dict vacío si no existe o está dañado.
+#     # """
+    ruta_manifest = os.path.join(ruta_destino, MANIFEST)
+    if not os.path.exists(ruta_manifest):
+        return {}
+    try:
+        with open(ruta_manifest, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"  [WARN] Manifest ilegible, se reconvierte todo: {e}")
+        return {}
+
+
+def guardar_manifest(ruta_destino, manifest):
+#     # """
+#     # Guarda el manifest escribiendo a un temporal y renombrando, para no dejarlo a medias.
+#     # """
+    ruta_manifest = os.path.join(ruta_destino, MANIFEST)
+    ruta_temporal = ruta_manifest + ".tmp"
+    with open(ruta_temporal, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(ruta_temporal, ruta_manifest)
+
+
+def _convertir_a_parquet(ruta_archivo, ruta_destino, sheet_name, carpeta_csv, sha256=None, tipado=True, columnas_esperadas=None):
+    # Convierte un solo archivo; se ejecuta dentro de un proceso del pool
+    archivo = os.path.basename(ruta_archivo)
+    nombre_base = os.path.splitext(archivo)[0]
+    nombre_salida = nombre_base + ".parquet"
+    inicio = time.time()
+
+    try:
+        stat = os.stat(ruta_archivo)
+        esquema = ESQUEMAS_SAP.get(detectar_reporte(archivo)) if tipado else None
+        df = leer_archivo_fuente(ruta_archivo, sheet_name=sheet_name, esquema=esquema, columnas_esperadas=columnas_esperadas)
+        if df is None:
+            return {"archivo": archivo, "estado": "WARN", "mensaje": "Extensión no soportada", "segundos": None}
+
+        if carpeta_csv:
+            df.to_csv(os.path.join(carpeta_csv, nombre_base + ".csv"), index=False, encoding='utf-8')
+
+        df = normalizar_nulos(aplicar_esquema(df, esquema)) if tipado else df.astype(str)
+
+        df.to_parquet(os.path.join(ruta_destino, nombre_salida), engine="pyarrow", index=False)
+
+        # Entrada del manifest para esta fuente
+        manifest = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "sha256": sha256 or hash_archivo(ruta_archivo),
+            "sheet_name": sheet_name,
+            "tipado": tipado,
+            "parquet": nombre_salida,
+            "esquema": {str(col): str(dtype) for col, dtype in df.dtypes.items()},
+        }
+        return {"archivo": archivo, "estado": "OK", "mensaje": f"Guardado: {nombre_salida}", "segundos": time.time() - inicio, "manifest": manifest}
+
+    except Exception as e:
+        return {"archivo": archivo, "estado": "ERROR", "mensaje": f"{type(e).__name__}: {e}", "segundos": time.time() - inicio}
+
+
+def convert_to_parquet(ruta_origen, ruta_destino, sheet_name=None, csv_debug=False, workers=None, incremental=True, tipado=True,
+                       encabezados=None):
+#     # """
+#     # Convierte a parquet los archivos de excel (xlsx, xlsm, xls, xlsb) y csv leyendo
+#     # cada archivo una sola vez, sin generar CSV intermedios.
 
 #     # Args:
 #     # - ruta_origen (str): Ruta de la carpeta que contiene los archivos Excel.
 #     # - ruta_destino (str): Ruta de la carpeta en la que se quiere guardar 
+#     # - sheet_name (str|int, optional): Hoja a convertir. Si no se proporciona, se usa la primera.
+#     # - csv_debug (bool): Si True, guarda además una copia CSV en ruta_destino/csv_debug.
+#     # - workers (int, optional): Procesos para convertir archivos en paralelo. None = en serie.
+#     # - incremental (bool): Si True, usa el manifest (_manifest.json en ruta_destino) para omitir
+#     #   fuentes sin cambios (mismo tamaño y mtime, o mismo sha256, leídas con la misma lógica:
+#     #   ver huella_lector) y marca los parquets cuya fuente ya no existe. False reconvierte todo.
+#     # - tipado (bool): Si True, aplica el registro de utils.esquemas según el reporte del nombre
+#     #   (llaves como texto exacto, importes decimales, fechas datetime64) y normaliza los nulos
+#     #   de texto ("", "nan", "null", "none"). False = todo str.
+#     # - encabezados (dict|bool, optional): Columnas esperadas por reporte ({"COBRADO": [...]}) para
+#     #   detectar el encabezado real cuando el archivo trae filas de título; por defecto las columnas
+#     #   de utils.esquemas del reporte. False = el encabezado siempre es la primera fila.
 
 #     # Returns:
-#     # - None
+#     # - list: Resultados por archivo.
 #     # """
     os.makedirs(ruta_destino, exist_ok=True)
 
+    carpeta_csv = None
+    if csv_debug:
+        carpeta_csv = os.path.join(ruta_destino, "csv_debug")
+        os.makedirs(carpeta_csv, exist_ok=True)
+
+    hoja = 0 if sheet_name is None else sheet_name
+    manifest = cargar_manifest(ruta_destino) if incremental else {}
+    lector = huella_lector()
+
+    tareas = []
+    omitidos = []
+    esperadas_por_archivo = {}
     for archivo in os.listdir(ruta_origen):
         ruta_archivo = os.path.join(ruta_origen, archivo)
 
-        if os.path.isfile(ruta_archivo):
-            nombre_salida = os.path.splitext(archivo)[0] + ".parquet"
-            ruta_salida = os.path.join(ruta_destino, nombre_salida)
-
-            try:
-                print(f"Leyendo: {archivo}")
+        if not os.path.isfile(ruta_archivo):
+            continue
 
-                ext = archivo.lower().split('.')[-1]
+        # Las columnas esperadas cambian qué fila se toma como encabezado: entran en el manifest
+        columnas_esperadas = None
+        if encabezados is not False:
+            reporte = detectar_reporte(archivo)
+            columnas_esperadas = (encabezados or {}).get(reporte) or list(ESQUEMAS_SAP.get(reporte) or []) or None
+        esperadas_por_archivo[archivo] = columnas_esperadas
 
-                if ext in ['xlsx', 'xls', 'xlsm']:
-                    # Puedes especificar engine si quieres, por ejemplo openpyxl para xlsx/xlsm
-                    df = pd.read_excel(ruta_archivo)
-                elif ext == 'csv':
-                    df = pd.read_csv(ruta_archivo, encoding='utf-8', on_bad_lines='skip')
-                else:
-                    print(f"  [WARN] Extensión no soportada: {archivo}")
+        previo = manifest.get(archivo)
+        sha256 = None
+        if (previo and previo.get("sheet_name") == hoja and previo.get("tipado", False) == tipado
+                and previo.get("lector") == lector and previo.get("encabezados") == columnas_esperadas
+                and os.path.exists(os.path.join(ruta_destino, previo["parquet"]))):
+            stat = os.stat(ruta_archivo)
+            if previo["size"] == stat.st_size and previo["mtime"] == stat.st_mtime:
+                omitidos.append(archivo)
+                continue
+            if previo["size"] == stat.st_size:
+                # Mismo tamaño pero distinto mtime (p.ej. copiado o resincronizado): comparar contenido
+                sha256 = hash_archivo(ruta_archivo)
+                if sha256 == previo["sha256"]:
+                    previo["mtime"] = stat.st_mtime
+                    omitidos.append(archivo)
                     continue
 
-                df = df.astype(str)
+        tareas.append((ruta_archivo, ruta_destino, hoja, carpeta_csv, sha256, tipado, columnas_esperadas))
 
-                df.to_parquet(ruta_salida, engine="pyarrow", index=False)
-                print(f"  [OK] Guardado: {nombre_salida}")
+    resultados = ejecutar_tareas(_convertir_a_parquet, tareas, workers=workers)
 
-            except Exception as e:
-                print(f"  [ERROR] Error en {archivo}: {e}")
+    for archivo in omitidos:
+        resultados.append({"archivo": archivo, "estado": "OMITIDO", "mensaje": "Sin cambios desde la última conversión", "segundos": None})
+
+    # Parquets cuya fuente ya no está en la carpeta de origen
+    fuentes = set(os.listdir(ruta_origen))
+    for archivo, entrada in list(manifest.items()):
+        if archivo in fuentes:
+            continue
+        if os.path.exists(os.path.join(ruta_destino, entrada["parquet"])):
+            resultados.append({"archivo": archivo, "estado": "WARN", "mensaje": f"Fuente eliminada, {entrada['parquet']} quedó huérfano", "segundos": None})
+        else:
+            del manifest[archivo]
+
+    if incremental:
+        for r in resultados:
+            if r["estado"] == "OK" and "manifest" in r:
+                manifest[r["archivo"]] = {**r["manifest"], "lector": lector,
+                                          "encabezados": esperadas_por_archivo.get(r["archivo"])}
+        guardar_manifest(ruta_destino, manifest)
+
+    return reportar_resultados(resultados, "Conversión a parquet terminada.")
 
 
 def is_valid_xlsx(path):
@@ -67,7 +363,46 @@ def is_valid_xlsx(path):
         return False
     
 
-def convert_to_csv(input_folder, sheet_name=None, backup_folder_name="old_bk"):
+def _excel_a_csv(ruta_archivo, backup_folder, sheet_name):
+    # Convierte un solo Excel a CSV y mueve el original; se ejecuta dentro de un proceso del pool
+    entry = Path(ruta_archivo)
+    ext = entry.suffix.lower()
+    inicio = time.time()
+
+    engine_map = {
+        '.xlsx': 'openpyxl',
+        '.xlsm': 'openpyxl',
+        '.xls' : 'xlrd',
+    }
+    engine = engine_map[ext]
+
+    # Validar XLSX/XLSM
+    if ext in ['.xlsx', '.xlsm']:
+        if not is_valid_xlsx(entry):
+            return {"archivo": entry.name, "estado": "WARN", "mensaje": "No es un archivo XLSX válido (no es ZIP). Se salta.", "segundos": None}
+
+    try:
+        if sheet_name:
+            df = pd.read_excel(entry, sheet_name=sheet_name, engine=engine)
+        else:
+            df = pd.read_excel(entry, sheet_name=0, engine=engine)
+
+        if df is None:
+            return {"archivo": entry.name, "estado": "WARN", "mensaje": f"Devolvió None al leer con engine={engine}.", "segundos": None}
+
+        csv_name = entry.stem + '.csv'
+        csv_path = entry.parent / csv_name
+        df.to_csv(csv_path, index=False, encoding='utf-8')
+
+        target_backup = Path(backup_folder) / entry.name
+        shutil.move(str(entry), str(target_backup))
+        return {"archivo": entry.name, "estado": "OK", "mensaje": f"Generado {csv_name}, original movido a {Path(backup_folder).name}", "segundos": time.time() - inicio}
+
+    except Exception as e:
+        return {"archivo": entry.name, "estado": "ERROR", "mensaje": f"{type(e).__name__}: {e}", "segundos": time.time() - inicio}
+
+
+def convert_to_csv(input_folder, sheet_name=None, backup_folder_name="old_bk", workers=None):
 #     # """
 #     # Convierte una hoja especfica de un archivo Excel cuyo nombre contiene una cadena dada a CSV
 #     # y mueve el original a una carpeta de respaldo.
@@ -76,65 +411,33 @@ def convert_to_csv(input_folder, sheet_name=None, backup_folder_name="old_bk"):
 #     # - input_folder (str): Ruta de la carpeta que contiene los archivos Excel.
 #     # - sheet_name (str): Nombre de la hoja que se desea convertir.
 #     # - backup_folder_name (str): Nombre de la carpeta de respaldo para mover el archivo original.
+#     # - workers (int, optional): Procesos para convertir archivos en paralelo. None = en serie.
 
 #     # Returns:
-#     # - None
+#     # - list: Resultados por archivo.
 #     # """
     input_folder = Path(input_folder)
     backup_folder = input_folder / backup_folder_name
     backup_folder.mkdir(exist_ok=True)
 
-    engine_map = {
-        '.xlsx': 'openpyxl',
-        '.xlsm': 'openpyxl',
-        '.xls' : 'xlrd',
-    }
-
+    tareas = []
     for entry in input_folder.iterdir():
         if not entry.is_file():
             continue
 
-        ext = entry.suffix.lower()
-        if ext not in engine_map:
+        if entry.suffix.lower() not in ('.xlsx', '.xlsm', '.xls'):
             continue
 
-        # Validar XLSX/XLSM
-        if ext in ['.xlsx', '.xlsm']:
-            if not is_valid_xlsx(entry):
-                print(f"  [WARN] {entry.name} no es un archivo XLSX válido (no es ZIP). Se salta.")
-                continue
-
-        engine = engine_map[ext]
-        print(f"\nProcesando {entry.name} con engine {engine} ...")
+        tareas.append((str(entry), str(backup_folder), sheet_name))
 
-        try:
-            if sheet_name:
-                df = pd.read_excel(entry, sheet_name=sheet_name, engine=engine)
-            else:
-                df = pd.read_excel(entry, sheet_name=0, engine=engine)
-
-            if df is None:
-                print(f"  [WARN] {entry.name} devolvió None al leer con engine={engine}.")
-                continue
-
-            csv_name = entry.stem + '.csv'
-            csv_path = input_folder / csv_name
-            df.to_csv(csv_path, index=False, encoding='utf-8')
-            print(f"  [OK] Generado {csv_name}")
-
-            target_backup = backup_folder / entry.name
-            shutil.move(str(entry), str(target_backup))
-            print(f"  [OK] Movido original a {backup_folder.name}/{entry.name}")
-
-        except Exception as e:
-            print(f"  [ERROR] Falló al procesar {entry.name}: {type(e).__name__}: {e}")
-
-    print("\nTodos los archivos procesados.")
+    resultados = ejecutar_tareas(_excel_a_csv, tareas, workers=workers)
+    return reportar_resultados(resultados, "Todos los archivos procesados.")
 
 
 def parquet_in_chunks(path_csv, columnas=None, chunk_size=50000, output_prefix="chunk", output_dir="parquet_output",encoding='utf-8'):
     # """
     # Convierte un archivo .csv grande a múltiples archivos Parquet por chunks usando pandas.
+    # Para un solo archivo de salida en streaming usar csv_a_parquet.
 
     # Parámetros:
     # - path_csv: ruta del archivo .csv
@@ -172,33 +475,309 @@ def parquet_in_chunks(path_csv, columnas=None, chunk_size=50000, output_prefix="
     print(f"[OK] Tiempo total: {elapsed:.2f} segundos")
 
 
-def join_chunks(input_dir="parquet_output", prefix="chunk", output_dir="parquets_unidos", output_name="archivo_final.parquet"):
+def _cargar_progreso(ruta_progreso, path_csv):
+    # Filas ya convertidas en un intento anterior, si el CSV no cambió desde entonces
+    try:
+        with open(ruta_progreso, 'r', encoding='utf-8') as f:
+            progreso = json.load(f)
+    except (OSError, ValueError):
+        return None
+    stat = os.stat(path_csv)
+    if progreso.get("size") != stat.st_size or progreso.get("mtime") != stat.st_mtime:
+        print("[WARN] El CSV cambió desde el intento anterior; se convierte desde el inicio.")
+        return None
+    return progreso
+
+
+def _filas_consumidas(previas, nuevas, invalidas):
+    # Filas del CSV (después del encabezado) que ya quedaron atrás tras escribir nuevas filas válidas:
+    # las inválidas omitidas antes de la última fila escrita también cuentan. El lector parsea bloques
+    # por adelantado, así que solo se cuentan las inválidas cuya posición cae antes de ese punto
+    if any(numero < 0 for numero in invalidas):
+        return previas + nuevas + len(invalidas)
+    consumidas = nuevas
+    for posicion in sorted(numero - 2 - previas for numero in invalidas):
+        if posicion >= consumidas:
+            break
+        consumidas += 1
+    return previas + consumidas
+
+
+def csv_a_parquet(path_csv, ruta_parquet, columnas=None, encoding=None, tamano_bloque=64 * 1024 * 1024,
+                  texto=True, compresion="zstd", reanudar=False, omitir_invalidas=False):
     # """
-    # Une archivos .parquet generados por chunks en un solo archivo Parquet.
+    # Convierte un CSV grande a un solo archivo Parquet en streaming: el lector CSV de Arrow parsea
+    # bloques de tamano_bloque bytes en varios hilos y cada bloque se escribe como row group con un solo
+    # ParquetWriter. La memoria depende del tamaño de bloque, no del archivo.
+
+    # Si la conversión falla a la mitad, lo escrito hasta ahí queda en ruta_parquet + ".parcial" junto
+    # con un .progreso.json; con reanudar=True se copian esos row groups y se continúa desde la fila
+    # siguiente del CSV en vez de empezar de cero.
+
+    # Parámetros:
+    # - path_csv: ruta del archivo .csv
+    # - ruta_parquet: archivo .parquet de salida
+    # - columnas: lista opcional con nombres de columnas a leer (None = todas)
+    # - encoding: codificación del CSV (por defecto se detecta)
+    # - tamano_bloque: bytes de CSV por bloque / row group
+    # - texto: si True todas las columnas se leen como texto (llaves con ceros a la izquierda);
+    #   False deja que Arrow infiera los tipos con el primer bloque
+    # - compresion: códec del parquet
+    # - reanudar: continuar un intento anterior que falló
+    # - omitir_invalidas: si True las filas con distinto número de campos se omiten (y se cuentan)
+    #   en lugar de detener la conversión
+
+    # Retorna:
+    # - int: Filas escritas, o None si falló.
+    # """
+    start_time = time.time()
+    if not os.path.isfile(path_csv):
+        print(f"[ERROR] No existe el archivo: {path_csv}")
+        return None
+    encoding = encoding or detectar_encoding(path_csv)
+    ruta_parcial = ruta_parquet + ".parcial"
+    ruta_progreso = ruta_parquet + ".progreso.json"
+    ruta_temporal = ruta_parquet + ".tmp"
+    os.makedirs(os.path.dirname(ruta_parquet) or ".", exist_ok=True)
+
+    previas = 0
+    progreso = _cargar_progreso(ruta_progreso, path_csv) if reanudar and os.path.exists(ruta_parcial) else None
+    if progreso:
+        previas = progreso.get("consumidas", progreso["filas"])
+        print(f"[OK] Reanudando '{path_csv}' desde la fila {previas} ({progreso['filas']} ya convertidas)...")
+    else:
+        print(f"[OK] Iniciando conversión de '{path_csv}' por bloques de {tamano_bloque / 1024 / 1024:.0f} MB...")
+
+    invalidas = []
+
+    def fila_invalida(fila):
+        invalidas.append(fila.number)
+        return 'skip'
+
+    filas = 0
+    nuevas = 0
+    writer = None
+    try:
+        column_types = None
+        if texto:
+            with open(path_csv, 'r', encoding=encoding, errors='replace', newline='') as f:
+                column_types = {nombre: pa.string() for nombre in next(csv.reader(f), [])}
+
+        reader = pacsv.open_csv(
+            path_csv,
+            read_options=pacsv.ReadOptions(block_size=tamano_bloque, encoding=encoding, use_threads=True,
+                                           skip_rows_after_names=previas),
+            parse_options=pacsv.ParseOptions(invalid_row_handler=fila_invalida if omitir_invalidas else None),
+            convert_options=pacsv.ConvertOptions(include_columns=columnas, column_types=column_types,
+                                                 strings_can_be_null=True),
+        )
+        writer = pq.ParquetWriter(ruta_temporal, reader.schema, compression=compresion)
+
+        if progreso:
+            # Lo convertido en el intento anterior, row group por row group
+            anterior = pq.ParquetFile(ruta_parcial)
+            if not anterior.schema_arrow.equals(reader.schema):
+                raise ValueError("El esquema del parcial no coincide con el CSV; convertir sin reanudar.")
+            for i in range(anterior.num_row_groups):
+                writer.write_table(anterior.read_row_group(i))
+            filas = anterior.metadata.num_rows
+
+        for batch in reader:
+            writer.write_batch(batch)
+            filas += batch.num_rows
+            nuevas += batch.num_rows
+
+    except Exception as e:
+        if writer is not None:
+            writer.close()
+        if nuevas:
+            # Lo escrito hasta aquí es un parquet válido: se guarda para reanudar. skip_rows_after_names
+            # cuenta filas del CSV, así que el punto de reanudación incluye las inválidas ya omitidas
+            os.replace(ruta_temporal, ruta_parcial)
+            stat = os.stat(path_csv)
+            with open(ruta_progreso, 'w', encoding='utf-8') as f:
+                json.dump({"filas": filas, "consumidas": _filas_consumidas(previas, nuevas, invalidas),
+                           "size": stat.st_size, "mtime": stat.st_mtime}, f)
+        elif os.path.exists(ruta_temporal):
+            # Nada nuevo: el parcial anterior (si lo hay) se conserva tal cual
+            os.remove(ruta_temporal)
+        print(f"[ERROR] Falló la conversión después de {filas} filas: {e}")
+        if nuevas:
+            print("[WARN] Vuelve a llamar con reanudar=True para continuar (con omitir_invalidas=True si son filas mal formadas).")
+        return None
+
+    writer.close()
+    os.replace(ruta_temporal, ruta_parquet)
+    for ruta in (ruta_parcial, ruta_progreso):
+        if os.path.exists(ruta):
+            os.remove(ruta)
+
+    if invalidas:
+        print(f"[WARN] {len(invalidas)} filas inválidas omitidas (primeras: {invalidas[:10]})")
+    elapsed = time.time() - start_time
+    print(f"[OK] {filas} filas guardadas en: {ruta_parquet} ({elapsed:.2f} segundos)")
+    return filas
+
+
+def _ajustar_esquema(tabla, esquema):
+    # Lleva un row group al esquema unificado: columnas faltantes como nulos, tipos promovidos
+    n = tabla.num_rows
+    columnas = [tabla.column(campo.name).cast(campo.type) if campo.name in tabla.column_names
+                else pa.nulls(n, type=campo.type) for campo in esquema]
+    return pa.Table.from_arrays(columnas, schema=esquema)
+
+
+def _numero_chunk(ruta):
+    # chunk_2 antes que chunk_10
+    numero = re.search(r'_(\d+)\.parquet$', ruta)
+    return (int(numero.group(1)) if numero else -1, ruta)
+
+
+def _row_groups(files, esquema):
+    for f in files:
+        archivo = pq.ParquetFile(f)
+        for i in range(archivo.num_row_groups):
+            yield _ajustar_esquema(archivo.read_row_group(i), esquema)
+
+
+def _escribir_compactado(row_groups, writer, filas_por_grupo):
+    # Junta row groups chicos hasta filas_por_grupo antes de escribir
+    pendientes, acumuladas, filas = [], 0, 0
+    for tabla in row_groups:
+        pendientes.append(tabla)
+        acumuladas += tabla.num_rows
+        if acumuladas >= filas_por_grupo:
+            writer.write_table(pa.concat_tables(pendientes), row_group_size=filas_por_grupo)
+            filas += acumuladas
+            pendientes, acumuladas = [], 0
+    if pendientes:
+        writer.write_table(pa.concat_tables(pendientes), row_group_size=filas_por_grupo)
+        filas += acumuladas
+    return filas
+
+
+def _corridas_ordenadas(row_groups, esquema, clave, carpeta, filas_por_corrida):
+    # Primera fase del ordenamiento externo: corridas de hasta filas_por_corrida filas ordenadas en disco
+    rutas, pendientes, acumuladas = [], [], 0
+
+    def volcar():
+        tabla = pa.concat_tables(pendientes).sort_by([(clave, "ascending")])
+        if not tabla.num_rows:
+            return
+        ruta = os.path.join(carpeta, f"corrida_{len(rutas):05d}.parquet")
+        pq.write_table(tabla, ruta, row_group_size=64 * 1024)
+        rutas.append(ruta)
+
+    for tabla in row_groups:
+        pendientes.append(tabla)
+        acumuladas += tabla.num_rows
+        if acumuladas >= filas_por_corrida:
+            volcar()
+            pendientes, acumuladas = [], 0
+    if pendientes:
+        volcar()
+    return rutas
+
+
+def _mezclar_corridas(rutas, clave, writer, filas_por_grupo):
+    # Segunda fase: mezcla de las corridas leyendo un lote de cada una. En cada vuelta se escriben las
+    # filas con clave <= la menor de las últimas claves de los lotes (ya no puede llegar nada menor).
+    # Los nulos van al final.
+    lectores = [pq.ParquetFile(ruta).iter_batches(batch_size=64 * 1024) for ruta in rutas]
+    primeros = [(next(lector, None), lector) for lector in lectores]
+    lotes = [pa.Table.from_batches([lote]) for lote, _ in primeros if lote is not None]
+    lectores = [lector for lote, lector in primeros if lote is not None]
+    filas = 0
+    while lotes:
+        # Un lote que termina en nulo ya no tiene claves por venir; si todos terminan en nulo se escribe todo
+        validas = [lote.column(clave)[-1] for lote in lotes if lote.column(clave)[-1].is_valid]
+        limite = min(validas, key=lambda u: u.as_py()) if validas else None
+
+        partes, siguientes = [], []
+        for lote, lector in zip(lotes, lectores):
+            if limite is None:
+                cuantas = lote.num_rows
+            else:
+                cuantas = pc.sum(pc.fill_null(pc.less_equal(lote.column(clave), limite), False)).as_py() or 0
+            partes.append(lote.slice(0, cuantas))
+            resto = lote.slice(cuantas)
+            if resto.num_rows == 0:
+                lote_siguiente = next(lector, None)
+                resto = pa.Table.from_batches([lote_siguiente]) if lote_siguiente is not None else None
+            if resto is not None:
+                siguientes.append((resto, lector))
+
+        salida = pa.concat_tables(partes).sort_by([(clave, "ascending")])
+        if salida.num_rows:
+            writer.write_table(salida, row_group_size=filas_por_grupo)
+            filas += salida.num_rows
+        lotes = [lote for lote, _ in siguientes]
+        lectores = [lector for _, lector in siguientes]
+    return filas
+
+
+def join_chunks(input_dir="parquet_output", prefix="chunk", output_dir="parquets_unidos", output_name="archivo_final.parquet",
+                ordenar_por=None, compresion="zstd", filas_por_grupo=FILAS_POR_GRUPO, filas_por_corrida=1_000_000):
+    # """
+    # Une archivos .parquet generados por chunks en un solo archivo Parquet, pasando row group por row
+    # group a un solo ParquetWriter (sin pandas): en memoria solo está el row group que se escribe.
+    # Los esquemas de los chunks se unifican (una columna toda nula en un chunk y texto en otro queda
+    # como texto; las que faltan en un chunk quedan nulas). Los chunks se toman en orden numérico.
 
     # Parámetros:
     # - input_dir: carpeta donde están los archivos .parquet
     # - prefix: prefijo común de los archivos a unir (ej. "chunk")
     # - output_dir: carpeta donde se guardará el archivo final
     # - output_name: nombre del archivo final .parquet (ej. "clientes_final.parquet")
+    # - ordenar_por: columna opcional para ordenar el resultado (ordenamiento externo: corridas
+    #   ordenadas en disco y mezcla; usa un lote de 64k filas por corrida en memoria)
+    # - compresion: códec del parquet final
+    # - filas_por_grupo: filas por row group del archivo final (los row groups chicos se juntan)
+    # - filas_por_corrida: filas por corrida al ordenar
+
+    # Retorna:
+    # - dict: {ruta, archivos, filas, bytes} o None si no hubo archivos o falló.
     # """
     os.makedirs(output_dir, exist_ok=True)
     pattern = os.path.join(input_dir, f"{prefix}_*.parquet")
-    files = sorted(glob(pattern))
+    files = sorted(glob(pattern), key=_numero_chunk)
 
     if not files:
         print(f"[WARN] No se encontraron archivos con patrón: {pattern}")
         return
 
     print(f"[OK] Uniendo {len(files)} archivos desde: {input_dir}")
+    start_time = time.time()
+    output_path = os.path.join(output_dir, output_name)
+    temporal = output_path + ".tmp"
+    carpeta_corridas = None
 
     try:
-        df = pd.concat([pd.read_parquet(f) for f in files], ignore_index=True)
-        output_path = os.path.join(output_dir, output_name)
-        df.to_parquet(output_path, index=False)
-        print(f"[OK] Archivo final guardado como: {output_path}")
+        esquema = pa.unify_schemas([pq.read_schema(f) for f in files], promote_options="permissive").remove_metadata()
+        if ordenar_por and ordenar_por not in esquema.names:
+            raise KeyError(f"'{ordenar_por}' no existe en los chunks")
+
+        with pq.ParquetWriter(temporal, esquema, compression=compresion) as writer:
+            if ordenar_por:
+                carpeta_corridas = tempfile.mkdtemp(prefix="corridas_", dir=output_dir)
+                corridas = _corridas_ordenadas(_row_groups(files, esquema), esquema, ordenar_por,
+                                               carpeta_corridas, filas_por_corrida)
+                filas = _mezclar_corridas(corridas, ordenar_por, writer, filas_por_grupo)
+            else:
+                filas = _escribir_compactado(_row_groups(files, esquema), writer, filas_por_grupo)
+        os.replace(temporal, output_path)
+
+        tamano = os.path.getsize(output_path)
+        elapsed = time.time() - start_time
+        print(f"[OK] Archivo final guardado como: {output_path} ({filas} filas, {tamano / 1024 / 1024:.1f} MB, {elapsed:.2f} segundos)")
+        return {"ruta": output_path, "archivos": len(files), "filas": filas, "bytes": tamano}
     except Exception as e:
+        if os.path.exists(temporal):
+            os.remove(temporal)
         print(f"[ERROR] Falló al unir archivos: {e}")
+    finally:
+        if carpeta_corridas:
+            shutil.rmtree(carpeta_corridas, ignore_errors=True)
 
 ############################################################
 ###############       DEPRECATED CODE        ###############
@@ -255,67 +834,296 @@ def convert_single_to_csv(input_folder, search_string, sheet_name, backup_folder
     print("Proceso completado.")
 
 
+def contar_lineas_csv(ruta_archivo, bloque=8 * 1024 * 1024, workers=None):
+#     # """
+#     # Cuenta las filas de datos de un CSV buscando saltos de línea en los bytes, por bloques en
+#     # paralelo (sin parsear). Los campos entre comillas con saltos de línea cuentan de más.
+
+#     # Args:
+#     # - ruta_archivo (str): Ruta del CSV.
+#     # - bloque (int): Bytes por bloque.
+#     # - workers (int, optional): Hilos de lectura (por defecto los núcleos).
+
+#     # Returns:
+#     # - int: Filas sin contar el encabezado.
+#     # """
+    tamano = os.path.getsize(ruta_archivo)
+    if tamano == 0:
+        return 0
+
+    def contar(inicio):
+        with open(ruta_archivo, 'rb') as f:
+            f.seek(inicio)
+            return f.read(bloque).count(b'\n')
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        saltos = sum(pool.map(contar, range(0, tamano, bloque)))
+
+    with open(ruta_archivo, 'rb') as f:
+        f.seek(tamano - 1)
+        sin_salto_final = f.read(1) != b'\n'
+    return max(saltos + sin_salto_final - 1, 0)
+
+
+def _leer_inicio(zf, nombre, limite=64 * 1024):
+    # Primeros bytes descomprimidos de un miembro del zip (no descomprime el resto)
+    with zf.open(nombre) as f:
+        return f.read(limite).decode('utf-8', errors='replace')
+
+
+def _hoja_xlsx(zf):
+    # Ruta dentro del zip de la primera hoja del libro
+    workbook = _leer_inicio(zf, 'xl/workbook.xml', limite=1024 * 1024)
+    rid = re.search(r'<(?:\w+:)?sheet\b[^>]*\br:id="([^"]+)"', workbook)
+    rels = _leer_inicio(zf, 'xl/_rels/workbook.xml.rels', limite=1024 * 1024)
+    for rel in re.finditer(r'<Relationship\b[^>]*>', rels):
+        if rid and f'Id="{rid.group(1)}"' in rel.group(0):
+            destino = re.search(r'Target="([^"]+)"', rel.group(0)).group(1)
+            return destino.lstrip('/') if destino.startswith('/') else 'xl/' + destino
+    return 'xl/worksheets/sheet1.xml'
+
+
+def contar_filas_xlsx(ruta_archivo):
+#     # """
+#     # Filas de datos de la primera hoja de un xlsx sin cargarla: rango de <dimension> al inicio del
+#     # XML de la hoja. Si el archivo no trae dimension útil, cuenta las etiquetas <row> en los bytes.
+#     # También devuelve el total de cadenas del libro (<sst count/uniqueCount> de sharedStrings.xml).
+
+#     # Returns:
+#     # - tuple: (filas sin encabezado, cadenas, cadenas únicas); las cadenas son None si no hay sharedStrings.
+#     # """
+    with ZipFile(ruta_archivo) as zf:
+        hoja = _hoja_xlsx(zf)
+        inicio = _leer_inicio(zf, hoja)
+        dimension = re.search(r'<(?:\w+:)?dimension\b[^>]*ref="[A-Z]+(\d+)(?::[A-Z]+(\d+))?"', inicio)
+        if dimension and dimension.group(2):
+            filas = int(dimension.group(2)) - int(dimension.group(1))
+        else:
+            filas = -1
+            with zf.open(hoja) as f:
+                resto = b''
+                for parte in iter(lambda: f.read(8 * 1024 * 1024), b''):
+                    parte = resto + parte
+                    filas += parte.count(b'<row ') + parte.count(b'<row>')
+                    # Una etiqueta cortada entre bloques queda completa en el siguiente (4 < len('<row '))
+                    resto = parte[-4:]
+            filas = max(filas, 0)
+
+        cadenas = unicas = None
+        if 'xl/sharedStrings.xml' in zf.namelist():
+            sst = _leer_inicio(zf, 'xl/sharedStrings.xml', limite=4096)
+            conteo = re.search(r'\bcount="(\d+)"', sst)
+            unico = re.search(r'\buniqueCount="(\d+)"', sst)
+            cadenas = int(conteo.group(1)) if conteo else None
+            unicas = int(unico.group(1)) if unico else None
+    return filas, cadenas, unicas
+
+
+def contar_filas_xlsb(ruta_archivo):
+#     # """
+#     # Filas de datos de la primera hoja de un xlsb según la dimensión registrada en la hoja (pyxlsb),
+#     # sin recorrer las celdas.
+#     # """
+    with open_workbook(ruta_archivo) as wb:
+        with wb.get_sheet(1) as hoja:
+            return max(hoja.dimension.h - 1, 0) if hoja.dimension else None
+
+
+def perfilar_archivo(path_archivo, n_preview=100, encoding=None):
+#     # """
+#     # Perfil de un archivo sin cargarlo completo: columnas y tipos de una muestra de n_preview filas,
+#     # filas totales leídas de los metadatos (ver contar_lineas_csv, contar_filas_xlsx, contar_filas_xlsb)
+#     # y tamaño en disco.
+
+#     # Parámetros:
+#     # - path_archivo: ruta al archivo (.xlsx, .xlsm, .xlsb o .csv)
+#     # - n_preview: filas de muestra para columnas y tipos
+#     # - encoding: codificación del CSV (por defecto se detecta)
+
+#     # Retorna:
+#     # - dict: {archivo, formato, bytes, filas, columnas, tipos, cadenas, cadenas_unicas, estado, mensaje}
+#     # """
+    ext = os.path.splitext(path_archivo)[1].lower()
+    perfil = {"archivo": os.path.basename(path_archivo), "formato": ext.lstrip('.'),
+              "bytes": os.path.getsize(path_archivo), "filas": None, "columnas": [], "tipos": {},
+              "cadenas": None, "cadenas_unicas": None, "estado": "OK", "mensaje": ""}
+    try:
+        if ext in ('.xlsx', '.xlsm'):
+            muestra = pd.read_excel(path_archivo, engine="openpyxl", nrows=n_preview)
+            perfil["filas"], perfil["cadenas"], perfil["cadenas_unicas"] = contar_filas_xlsx(path_archivo)
+        elif ext == '.xlsb':
+            muestra = pd.read_excel(path_archivo, engine="pyxlsb", nrows=n_preview)
+            perfil["filas"] = contar_filas_xlsb(path_archivo)
+        elif ext == '.csv':
+            muestra = pd.read_csv(path_archivo, encoding=encoding or detectar_encoding(path_archivo), nrows=n_preview)
+            perfil["filas"] = contar_lineas_csv(path_archivo)
+        else:
+            perfil.update(estado="WARN", mensaje=f"Formato no soportado: {ext}")
+            return perfil
+
+        perfil["columnas"] = [str(col) for col in muestra.columns]
+        perfil["tipos"] = {str(col): str(tipo) for col, tipo in muestra.dtypes.items()}
+    except Exception as e:
+        perfil.update(estado="ERROR", mensaje=f"{type(e).__name__}: {e}")
+    return perfil
+
+
+def perfilar_carpeta(ruta_carpeta, n_preview=100, workers=None):
+#     # """
+#     # Perfila todos los archivos soportados de una carpeta en paralelo (hilos), para revisar lo que
+#     # mandó el cliente antes de correr la conversión completa.
+
+#     # Parámetros:
+#     # - ruta_carpeta: carpeta a revisar
+#     # - n_preview: filas de muestra por archivo
+#     # - workers: hilos (por defecto los núcleos)
+
+#     # Retorna:
+#     # - pd.DataFrame: Un renglón por archivo (ver perfilar_archivo), ordenado por nombre.
+#     # """
+    rutas = sorted(os.path.join(ruta_carpeta, f) for f in os.listdir(ruta_carpeta)
+                   if os.path.splitext(f)[1].lower() in ('.xlsx', '.xlsm', '.xlsb', '.csv'))
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        perfiles = list(pool.map(lambda ruta: perfilar_archivo(ruta, n_preview=n_preview), rutas))
+
+    for p in perfiles:
+        filas = p["filas"] if p["filas"] is not None else "?"
+        print(f"  [{p['estado']}] {p['archivo']}: {filas} filas, {len(p['columnas'])} columnas, "
+              f"{p['bytes'] / 1024 / 1024:.1f} MB {p['mensaje']}".rstrip())
+    return pd.DataFrame(perfiles, columns=["archivo", "formato", "bytes", "filas", "columnas", "tipos",
+                                           "cadenas", "cadenas_unicas", "estado", "mensaje"])
+
+
 def explorar_archivo(path_archivo, n_preview=100, encoding='utf-8'):
     # """
-    # Explora un archivo .xlsx o .csv, mostrando:
+    # Explora un archivo .xlsx, .xlsb o .csv, mostrando:
     # - Lista de columnas
-    # - Número estimado de filas
-    # - Primeras filas de ejemplo
+    # - Número estimado de filas (de los metadatos, sin cargar el archivo; ver perfilar_archivo)
 
     # Parámetros:
-    # - path_archivo: ruta al archivo (soporta .xlsx y .csv)
+    # - path_archivo: ruta al archivo (soporta .xlsx, .xlsb y .csv)
     # - n_preview: número de filas para mostrar como muestra
     # - encoding: codificación usada en CSV (por defecto 'utf-8')
     # """
-    ext = os.path.splitext(path_archivo)[1].lower()
+    perfil = perfilar_archivo(path_archivo, n_preview=n_preview, encoding=encoding)
+    if perfil["estado"] != "OK":
+        print(f"[ERROR] No se pudo explorar el archivo: {perfil['mensaje']}")
+        return []
+
+    columnas = perfil["columnas"]
+    print(f"[OK] Columnas ({len(columnas)}): {columnas}")
+    print(f"[OK] Filas estimadas: {perfil['filas']}")
+    return columnas
+
+
+def detectar_encoding(ruta_archivo, muestra=64 * 1024):
+    # """
+    # Detecta el encoding de un archivo de texto a partir de una muestra de sus primeros bytes.
+    # Parámetros:
+    # - ruta_archivo: ruta al archivo
+    # - muestra: número de bytes a revisar
+    # Retorna:
+    # - str: 'utf-8-sig', 'utf-16', 'utf-8', 'cp1252' o 'latin1'
+    # """
+    with open(ruta_archivo, 'rb') as f:
+        datos = f.read(muestra)
+
+    if datos.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if datos.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+
+    for encoding in ('utf-8', 'cp1252'):
+        try:
+            # final=False tolera un carácter multibyte cortado al final de la muestra
+            codecs.getincrementaldecoder(encoding)().decode(datos, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return 'latin1'
+
 
+def _transcodificar(ruta_archivo, encoding, bloque):
+    # Reescribe el archivo en UTF-8 por bloques de tamaño fijo a un temporal en la misma carpeta
+    # y lo renombra al terminar; si algo falla el original queda intacto.
+    carpeta = os.path.dirname(os.path.abspath(ruta_archivo))
+    decoder = codecs.getincrementaldecoder(encoding)(errors='strict')
+    fd, ruta_temporal = tempfile.mkstemp(prefix=".utf8_", suffix=".tmp", dir=carpeta)
     try:
-        if ext == ".xlsx":
-            df = pd.read_excel(path_archivo, engine="openpyxl", nrows=n_preview)
-            total_df = pd.read_excel(path_archivo, engine="openpyxl", usecols=[0])
-        elif ext == ".csv":
-            df = pd.read_csv(path_archivo, encoding=encoding, nrows=n_preview)
-            total_df = pd.read_csv(path_archivo, encoding=encoding, usecols=[0])
-        else:
-            print(f"[ERROR] Formato no soportado: {ext}")
-            return []
+        with open(ruta_archivo, 'rb') as origen, os.fdopen(fd, 'w', encoding='utf-8', newline='') as destino:
+            for parte in iter(lambda: origen.read(bloque), b''):
+                destino.write(decoder.decode(parte))
+            destino.write(decoder.decode(b'', final=True))
+        shutil.copymode(ruta_archivo, ruta_temporal)
+        os.replace(ruta_temporal, ruta_archivo)
+    except BaseException:
+        os.remove(ruta_temporal)
+        raise
 
-        columnas = df.columns.tolist()
-        print(f"[OK] Columnas ({len(columnas)}): {columnas}")
-        print(f"[OK] Filas estimadas: {len(total_df)}")
 
-        return columnas
+def es_utf8_valido(ruta_archivo, bloque=1024 * 1024):
+    # """
+    # Valida en memoria constante que todo el archivo sea UTF-8.
+    # """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        with open(ruta_archivo, 'rb') as f:
+            for parte in iter(lambda: f.read(bloque), b''):
+                decoder.decode(parte)
+            decoder.decode(b'', final=True)
+        return True
+    except UnicodeDecodeError:
+        return False
 
-    except Exception as e:
-        print(f"[ERROR] No se pudo explorar el archivo: {e}")
-        return []
-    
-def csv_to_utf8(ruta_archivo):
+
+def csv_to_utf8(ruta_archivo, bloque=1024 * 1024):
     # """
-    # Ccambia el encodig de csv a UFT-8
+    # Cambia el encoding de un csv a UTF-8 por streaming: detecta el encoding con una muestra,
+    # omite los archivos que ya son UTF-8 válido y convierte el resto por bloques de tamaño fijo
+    # escribiendo a un temporal que se renombra al terminar.
     # Parámetros:
     # - ruta_archivo: ruta al archivo (.csv)
+    # - bloque: tamaño de lectura en bytes
+    # Retorna:
+    # - str: 'omitido', 'convertido' o 'error'
     # """
     try:
-        with open(ruta_archivo, 'rb') as f:
-            contenido = f.read()
-        # Decodificar usando 'latin1' que no falla nunca (map ea byte a unicode)
-        texto = contenido.decode('latin1')
-        # Guardar sobrescribiendo en UTF-8
-        with open(ruta_archivo, 'w', encoding='utf-8') as f:
-            f.write(texto)
-        print(f"[OK] Convertido a UTF-8 (sin validar): {ruta_archivo}")
+        encoding = detectar_encoding(ruta_archivo)
+
+        if encoding == 'utf-8':
+            if es_utf8_valido(ruta_archivo, bloque):
+                print(f"[OK] Ya es UTF-8, se omite: {ruta_archivo}")
+                return 'omitido'
+            # La muestra era UTF-8 pero el resto no: lo más común en SAP es cp1252
+            encoding = 'cp1252'
+
+        try:
+            _transcodificar(ruta_archivo, encoding, bloque)
+        except UnicodeDecodeError:
+            # cp1252 no define algunos bytes; latin1 mapea todos
+            encoding = 'latin1'
+            _transcodificar(ruta_archivo, encoding, bloque)
+
+        print(f"[OK] Convertido de {encoding} a UTF-8: {ruta_archivo}")
+        return 'convertido'
     except Exception as e:
         print(f"[ERROR] No se pudo convertir {ruta_archivo}: {e}")
+        return 'error'
 
 def bulk_csv_to_utf8(ruta_raiz):
     # """
-    # Forza el cambio el encodig de csv a UFT-8
+    # Cambia a UTF-8 todos los csv de una carpeta (y subcarpetas) que no lo sean
     # Parámetros:
     # - ruta_raiz: ruta al la carpeta donde hay harchivos
+    # Retorna:
+    # - dict: conteo de archivos {'convertido', 'omitido', 'error'}
     # """
+    conteo = {'convertido': 0, 'omitido': 0, 'error': 0}
     for carpeta, _, archivos in os.walk(ruta_raiz):
         for archivo in archivos:
             if archivo.lower().endswith('.csv'):
                 ruta_archivo = os.path.join(carpeta, archivo)
-                csv_to_utf8(ruta_archivo)
+                conteo[csv_to_utf8(ruta_archivo)] += 1
+
+    print(f"[OK] CSV convertidos: {conteo['convertido']}, omitidos (ya UTF-8): {conteo['omitido']}, errores: {conteo['error']}")
+    return conteo
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from utils.df_utils import construir_indice, posiciones_union, _claves_arrow, COLUMNAS_PARTICION
+
+
+def _particion_de(claves, particiones):
+    # Partición de cada fila según el hash de su clave; la misma clave cae en la misma partición
+    # de los dos lados. Los nulos se hashean como "" (caen juntos; la unión los sigue distinguiendo).
+    valores = _claves_arrow(claves)
+    if not pa.types.is_large_string(valores.type):
+        valores = valores.cast(pa.large_string())
+    valores = valores.fill_null("").to_numpy(zero_copy_only=False)
+    return (pd.util.hash_array(valores, categorize=True) % particiones).astype(np.int64)
+
+
+def particionar(ruta_parquet, columna, carpeta, particiones, filas_por_lote=100_000):
+    # """
+    # Reparte un parquet en archivos por partición de la clave, leyendo y escribiendo por lotes
+    # (nunca se carga el archivo completo).
+
+    # Args:
+    #     ruta_parquet (str): Archivo de origen o dataset particionado (sin sus columnas de partición).
+    #     columna (str): Columna clave.
+    #     carpeta (str): Carpeta donde se escriben las particiones (parte_00000.parquet, ...).
+    #     particiones (int): Número de particiones.
+    #     filas_por_lote (int): Filas leídas por lote.
+
+    # Returns:
+    #     tuple: (rutas, esquema). rutas[i] es None si la partición i quedó vacía.
+    # """
+    os.makedirs(carpeta, exist_ok=True)
+    origen = ds.dataset(ruta_parquet, format="parquet", partitioning="hive")
+    columnas = [c for c in origen.schema.names if not (os.path.isdir(ruta_parquet) and c in COLUMNAS_PARTICION)]
+    esquema = pa.schema([origen.schema.field(c) for c in columnas])
+    if columna not in esquema.names:
+        raise KeyError(f"'{columna}' no existe en {ruta_parquet}")
+
+    escritores = {}
+    try:
+        for lote in origen.to_batches(columns=columnas, batch_size=filas_por_lote):
+            particion = _particion_de(lote.column(columna), particiones)
+            orden = np.argsort(particion, kind="stable")
+            limites = np.cumsum(np.bincount(particion, minlength=particiones))
+            inicio = 0
+            for i, fin in enumerate(limites):
+                if fin > inicio:
+                    if i not in escritores:
+                        ruta = os.path.join(carpeta, f"parte_{i:05d}.parquet")
+                        escritores[i] = pq.ParquetWriter(ruta, esquema)
+                    escritores[i].write_batch(lote.take(pa.array(orden[inicio:fin])))
+                inicio = fin
+    finally:
+        for escritor in escritores.values():
+            escritor.close()
+
+    rutas = [os.path.join(carpeta, f"parte_{i:05d}.parquet") if i in escritores else None
+             for i in range(particiones)]
+    return rutas, esquema
+
+
+class _Salida:
+    # Escritor incremental del resultado: parquet (un solo ParquetWriter) o csv (mismo formato que
+    # guardar_dataframe, por bloques en modo append). Escribe a un temporal y lo renombra al cerrar.
+
+    def __init__(self, destino, esquema):
+        self.destino = destino
+        self.temporal = destino + ".tmp"
+        self.formato = os.path.splitext(destino)[1].lower().lstrip(".")
+        if self.formato not in ("parquet", "csv"):
+            raise ValueError("Formato no soportado. Usa 'parquet' o 'csv'.")
+        os.makedirs(os.path.dirname(destino) or ".", exist_ok=True)
+        self.escritor = pq.ParquetWriter(self.temporal, esquema) if self.formato == "parquet" else None
+        self.esquema = esquema
+        self.filas = 0
+
+    def escribir(self, tabla):
+        if self.formato == "parquet":
+            self.escritor.write_table(tabla)
+        else:
+            tabla.to_pandas().to_csv(self.temporal, index=False, mode="a" if self.filas else "w",
+                                     header=not self.filas)
+        self.filas += tabla.num_rows
+
+    def cerrar(self):
+        if self.escritor is not None:
+            self.escritor.close()
+        elif not self.filas:
+            # Sin filas: csv solo con encabezado
+            self.esquema.empty_table().to_pandas().to_csv(self.temporal, index=False)
+        os.replace(self.temporal, self.destino)
+
+    def descartar(self):
+        if self.escritor is not None:
+            self.escritor.close()
+        if os.path.exists(self.temporal):
+            os.remove(self.temporal)
+
+
+def unir_en_disco(ruta_izq, ruta_der, col1, col2, destino, tipo_union="left", particiones=32,
+                  carpeta_temporal=None, filas_por_lote=100_000):
+    # """
+    # Une dos parquets más grandes que la memoria: reparte ambos lados por hash de la clave en
+    # archivos temporales, une partición por partición (misma lógica y columnas que
+    # unir_dataframes(rapido=True): sufijo '_sec', nulo une con nulo) y va escribiendo el resultado.
+    # La memoria usada depende del tamaño de una partición, no del total.
+    # Las filas salen agrupadas por partición, no en el orden original de ruta_izq.
+
+    # Args:
+    #     ruta_izq (str): Parquet o dataset particionado izquierdo (p.ej. cobranza).
+    #     ruta_der (str): Parquet derecho (p.ej. clientes).
+    #     col1 (str): Clave en ruta_izq.
+    #     col2 (str): Clave en ruta_der.
+    #     destino (str): Archivo de salida .parquet o .csv.
+    #     tipo_union (str): 'left' o 'inner'.
+    #     particiones (int): Número de particiones; subirlo si una partición no cabe en memoria.
+    #     carpeta_temporal (str, optional): Dónde escribir las particiones (por defecto el temporal del sistema).
+    #     filas_por_lote (int): Filas leídas por lote al particionar.
+
+    # Returns:
+    #     int: Filas escritas.
+    # """
+    if tipo_union not in ("left", "inner"):
+        raise ValueError("unir_en_disco solo soporta tipo_union 'left' o 'inner'.")
+
+    temporal = tempfile.mkdtemp(prefix="union_", dir=carpeta_temporal)
+    salida = None
+    try:
+        partes_izq, esquema_izq = particionar(ruta_izq, col1, os.path.join(temporal, "izq"), particiones, filas_por_lote)
+        partes_der, esquema_der = particionar(ruta_der, col2, os.path.join(temporal, "der"), particiones, filas_por_lote)
+
+        # Columnas del resultado, igual que unir_dataframes: la clave derecha se omite si se llama
+        # igual que la izquierda y las repetidas llevan sufijo '_sec'
+        columnas_der = [c for c in esquema_der.names if not (col1 == col2 and c == col2)]
+        nombres_der = [f"{c}_sec" if c in esquema_izq.names else c for c in columnas_der]
+        esquema = pa.schema(list(esquema_izq) + [esquema_der.field(c).with_name(n) for c, n in zip(columnas_der, nombres_der)])
+
+        salida = _Salida(destino, esquema)
+        for parte_izq, parte_der in zip(partes_izq, partes_der):
+            if parte_izq is None:
+                continue
+            izquierda = pq.read_table(parte_izq)
+            derecha = pq.read_table(parte_der) if parte_der else esquema_der.empty_table()
+
+            indice = construir_indice(derecha, col2)
+            pos_izq, pos_der = posiciones_union(izquierda.column(col1), indice, tipo_union)
+            if not len(pos_izq):
+                continue
+            # Índices nulos en take = filas sin match
+            pos_der = pa.array(pos_der, mask=pos_der < 0)
+            derecha = derecha.select(columnas_der).take(pos_der).rename_columns(nombres_der)
+            izquierda = izquierda.take(pa.array(pos_izq))
+            salida.escribir(pa.Table.from_arrays(izquierda.columns + derecha.columns, schema=esquema))
+
+        salida.cerrar()
+        print(f"  [OK] Union en disco completada. Filas: {salida.filas} -> {destino}")
+        return salida.filas
+    except Exception:
+        if salida is not None:
+            salida.descartar()
+        raise
+    finally:
+        shutil.rmtree(temporal, ignore_errors=True)